@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, delete, insert, literal, select
+
+import models, response_cache
+from database import engine, SessionLocal
+
+# Background archival of finished gatherings. A gathering whose window closed
+# more than ARCHIVE_AFTER_DAYS ago is moved with all its claims from
+# gatherings/claims into gatherings_archive/claims_archive. That includes
+# claims never collected: they keep their "claimed" status in the archive,
+# where the stats still count them.
+#
+# Rows move in batches of ARCHIVE_BATCH_SIZE gatherings, each batch being one
+# short transaction (copy, then delete), with ARCHIVE_PAUSE_SECONDS between
+# batches so request writes are never kept waiting on the SQLite write lock
+# for long. One run does at most ARCHIVE_MAX_BATCHES batches (0 for no
+# limit); whatever is left is picked up by the next run, every
+# ARCHIVE_INTERVAL_SECONDS (0 disables the background job). Run
+# `python archive.py` to archive everything now.
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_MAX_BATCHES = int(os.environ.get("ARCHIVE_MAX_BATCHES", "200"))
+ARCHIVE_PAUSE_SECONDS = float(os.environ.get("ARCHIVE_PAUSE_SECONDS", "0.05"))
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+GATHERING_COLUMNS = [c.name for c in models.Gathering.__table__.columns]
+CLAIM_COLUMNS = [c.name for c in models.Claim.__table__.columns]
+
+@dataclass
+class ArchiveReport:
+    started_at: datetime
+    gatherings: int = 0
+    claims: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    slowest_batch_seconds: float = 0.0
+    finished: bool = False  # False if the run stopped at max_batches
+
+# Totals since startup, for /metrics
+totals = {"gatherings": 0, "claims": 0, "batches": 0}
+last_report = None
+_run_lock = threading.Lock()
+
+def _archivable_ids(db, cutoff, limit):
+    gathering = models.Gathering
+    return db.scalars(
+        select(gathering.id).where(
+            # Both is_taken values, so the (is_taken, available_to) index
+            # serves the range on available_to
+            gathering.is_taken.in_([False, True]),
+            gathering.available_to < cutoff
+        ).limit(limit)
+    ).all()
+
+def archive_batch(db, ids, archived_at):
+    """Move the given gatherings and their claims in one transaction."""
+    gatherings, claims = models.Gathering.__table__, models.Claim.__table__
+    archived_at = literal(archived_at, DateTime)
+    try:
+        claim_count = db.execute(
+            insert(models.ArchivedClaim.__table__).from_select(
+                CLAIM_COLUMNS + ["archived_at"],
+                select(*[claims.c[name] for name in CLAIM_COLUMNS], archived_at)
+                .where(claims.c.gathering_id.in_(ids))
+            )
+        ).rowcount
+        db.execute(
+            insert(models.ArchivedGathering.__table__).from_select(
+                GATHERING_COLUMNS + ["archived_at"],
+                select(*[gatherings.c[name] for name in GATHERING_COLUMNS], archived_at)
+                .where(gatherings.c.id.in_(ids))
+            )
+        )
+        db.execute(delete(claims).where(claims.c.gathering_id.in_(ids)))
+        db.execute(delete(gatherings).where(gatherings.c.id.in_(ids)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return claim_count
+
+def run(db, now=None, batch_size=None, max_batches=None, pause=None, progress=None):
+    """
+    Archive finished gatherings until none are left or max_batches batches
+    have run. progress(report) is called after every batch.
+    """
+    global last_report
+    batch_size = batch_size or ARCHIVE_BATCH_SIZE
+    max_batches = ARCHIVE_MAX_BATCHES if max_batches is None else max_batches
+    pause = ARCHIVE_PAUSE_SECONDS if pause is None else pause
+    with _run_lock:
+        now = now or datetime.now()
+        cutoff = now - timedelta(days=ARCHIVE_AFTER_DAYS)
+        report = ArchiveReport(started_at=now)
+        started = time.perf_counter()
+        while not max_batches or report.batches < max_batches:
+            batch_started = time.perf_counter()
+            ids = _archivable_ids(db, cutoff, batch_size)
+            if not ids:
+                report.finished = True
+                break
+            claim_count = archive_batch(db, ids, now)
+            response_cache.invalidate("gatherings", "claims", *(f"gathering:{i}" for i in ids))
+
+            batch_seconds = time.perf_counter() - batch_started
+            report.batches += 1
+            report.gatherings += len(ids)
+            report.claims += claim_count
+            report.slowest_batch_seconds = max(report.slowest_batch_seconds, batch_seconds)
+            report.seconds = time.perf_counter() - started
+            totals["batches"] += 1
+            totals["gatherings"] += len(ids)
+            totals["claims"] += claim_count
+            logger.info("archive batch %d: %d gatherings, %d claims in %.3fs (%d gatherings so far)",
+                        report.batches, len(ids), claim_count, batch_seconds, report.gatherings)
+            if progress is not None:
+                progress(report)
+            if len(ids) < batch_size:
+                report.finished = True
+                break
+            time.sleep(pause)
+        report.seconds = time.perf_counter() - started
+        last_report = report
+        return report
+
+def run_with_session(**options):
+    db = SessionLocal()
+    try:
+        return run(db, **options)
+    finally:
+        db.close()
+
+async def run_periodically(interval=ARCHIVE_INTERVAL_SECONDS):
+    while True:
+        try:
+            report = await asyncio.to_thread(run_with_session)
+            if report.gatherings:
+                logger.info("archived %d gatherings and %d claims in %d batches, %.2fs",
+                            report.gatherings, report.claims, report.batches, report.seconds)
+        except Exception:
+            logger.exception("archive run failed")
+        await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+    def show(report):
+        print(f"batch {report.batches}: {report.gatherings} gatherings, {report.claims} claims, "
+              f"{report.seconds:.2f}s elapsed, slowest batch {report.slowest_batch_seconds:.3f}s")
+
+    models.Base.metadata.create_all(bind=engine)
+    report = run_with_session(max_batches=0, progress=show)
+    print(f"done: {report.gatherings} gatherings and {report.claims} claims archived "
+          f"in {report.batches} batches, {report.seconds:.2f}s")
@@ -0,0 +1,253 @@
+"""
+Load test for the main API endpoints at several dataset sizes and
+concurrency levels, in-process or over HTTP.
+
+For each --sizes value N the dataset is grown (see datagen.py) to N
+gatherings, N/10 donors, N/2 recipients and N/10 claims. Each scenario is
+then driven at every --concurrency level, and its throughput and latency
+percentiles are recorded:
+
+    nearby  GET  /gatherings/nearby, random point in the city, 3 km, limit 50
+    list    GET  /gatherings/?limit=100
+    claim   POST /claims/ on a different open gathering each time
+    token   POST /users/token (bcrypt, so capped at --token-requests)
+
+--mode inprocess drives main.app through httpx's ASGI transport;
+--mode http starts `uvicorn main:app` on the dataset and drives it over
+TCP. Results are written as JSON to --output; compare two runs with
+benchmarks/compare.py.
+
+    cd backend && python benchmarks/api_bench.py [--sizes 1000 10000] \\
+        [--concurrency 1 8 32] [--requests 500] [--mode inprocess] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("MATCH_INTERVAL_SECONDS", "0")
+os.environ.setdefault("RATE_LIMIT", "0")  # one client, many requests
+
+import httpx  # noqa: E402
+
+import datagen, live_index, models, response_cache  # noqa: E402
+from database import engine, SessionLocal  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from routers.users import create_access_token  # noqa: E402
+
+SCENARIOS = ("nearby", "list", "claim", "token")
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+async def drive(client, make_request, total, concurrency):
+    """Send total requests from concurrency workers and summarize them."""
+    latencies, statuses = [], Counter()
+    remaining = iter(range(total))
+
+    async def worker():
+        for i in remaining:
+            request = make_request(i)
+            if request is None:
+                return
+            method, url, options = request
+            start = time.perf_counter()
+            response = await client.request(method, url, **options)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None  # noqa: E731
+    return {
+        "requests": len(latencies),
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1]) if latencies else None,
+    }
+
+def scenario_requests(name, rng, totals, tokens, open_ids):
+    city = datagen.CITY
+
+    def nearby(i):
+        latitude, longitude = datagen.random_point(rng, city)
+        return "GET", "/gatherings/nearby", {
+            "params": {"latitude": latitude, "longitude": longitude, "max_distance": 3, "limit": 50},
+            "headers": rng.choice(tokens),
+        }
+
+    def listing(i):
+        return "GET", "/gatherings/", {"params": {"limit": 100}, "headers": rng.choice(tokens)}
+
+    def claim(i):
+        if not open_ids:
+            return None
+        return "POST", "/claims/", {
+            "json": {"gathering_id": open_ids.pop()}, "headers": rng.choice(tokens)
+        }
+
+    def token(i):
+        email = f"recipient{rng.randrange(totals['recipients'])}@example.com"
+        return "POST", "/users/token", {"data": {"username": email, "password": datagen.PASSWORD}}
+
+    return {"nearby": nearby, "list": listing, "claim": claim, "token": token}[name]
+
+def recipient_tokens(count):
+    return [
+        {"Authorization": f"Bearer {create_access_token({'sub': f'recipient{n}@example.com'}, timedelta(hours=2))}"}
+        for n in range(count)
+    ]
+
+def open_gathering_ids(rng):
+    db = SessionLocal()
+    try:
+        ids = sorted(live_index.query_open_gathering_ids(db, datetime.now()))
+    finally:
+        db.close()
+    rng.shuffle(ids)
+    return ids
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=os.environ.copy(),
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start within 60s")
+
+async def run_size(args, size, rng, counts, results):
+    target = {"donors": max(1, size // 10), "recipients": max(1, size // 2),
+              "gatherings": size, "claims": size // 10}
+    totals = datagen.populate(
+        engine, seed=size, **{table: max(0, target[table] - counts[table]) for table in target}
+    )
+    counts.update(totals)
+    print(f"dataset: {totals}")
+    tokens = recipient_tokens(min(totals["recipients"], 500))
+
+    server = None
+    if args.mode == "inprocess":
+        import main
+        db = SessionLocal()
+        try:
+            live_index.index.load(db)  # what the startup hook would do
+        finally:
+            db.close()
+        response_cache.cache.clear()
+        transport = httpx.ASGITransport(app=main.app)
+        base_url = "http://bench"
+    else:
+        port = free_port()
+        server = start_server(port)
+        transport = None
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        for concurrency in args.concurrency:
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            async with httpx.AsyncClient(transport=transport, base_url=base_url,
+                                         limits=limits, timeout=120) as client:
+                for name in args.scenarios:
+                    total = min(args.requests, args.token_requests) if name == "token" else args.requests
+                    make_request = scenario_requests(
+                        name, rng, totals, tokens, open_gathering_ids(rng) if name == "claim" else None
+                    )
+                    summary = await drive(client, make_request, total, concurrency)
+                    results.append({"size": size, "dataset": totals, "mode": args.mode,
+                                    "scenario": name, "concurrency": concurrency, **summary})
+                    print(f"size={size:<8} c={concurrency:<4} {name:<7} "
+                          f"{summary['throughput_rps']:>8} req/s  p50={summary['p50_ms']}ms "
+                          f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms  {summary['statuses']}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="gathering counts, grown in increasing order")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--token-requests", type=int, default=100)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+    parser.add_argument("--no-response-cache", action="store_true",
+                        help="run with RESPONSE_CACHE_TTL=0")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=f"api_bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    args = parser.parse_args()
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_TTL"] = "0"  # for the uvicorn child
+        response_cache.RESPONSE_CACHE_TTL = 0
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    rng = random.Random(args.seed)
+    counts = {"donors": 0, "recipients": 0, "gatherings": 0, "claims": 0}
+    results = []
+    for size in sorted(args.sizes):
+        asyncio.run(run_size(args, size, rng, counts, results))
+
+    report = {
+        "meta": {
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database_url": os.environ["DATABASE_URL"],
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Concurrency benchmark: many recipients claim the same gathering at once.
+
+Creates RECIPIENTS recipients and one open gathering, fires all their
+POST /claims/ requests simultaneously through the in-process app, and checks
+that exactly one succeeds, only one claim row exists, and the slowest
+request finished within --max-latency seconds. Repeats for --rounds
+gatherings. Exits non-zero on any violation.
+
+    cd backend && python benchmarks/claim_contention.py [--recipients 300] [--rounds 5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("RATE_LIMIT", "0")  # one client, many requests
+
+import httpx  # noqa: E402
+
+import main, models  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from passwords import hash_password  # noqa: E402
+from routers.users import create_access_token  # noqa: E402
+
+def seed(recipients):
+    """Insert users directly, sharing one bcrypt hash, and mint their tokens."""
+    db = SessionLocal()
+    try:
+        password = hash_password("benchmark-password")
+        donor = models.User(name="donor", email="donor@example.com", password=password,
+                            user_type="donor", latitude=12.97, longitude=77.59)
+        db.add(donor)
+        emails = [f"recipient{i}@example.com" for i in range(recipients)]
+        db.add_all([
+            models.User(name=email, email=email, password=password,
+                        user_type="recipient", latitude=12.97, longitude=77.59)
+            for email in emails
+        ])
+        db.commit()
+        return donor.id, [
+            {"Authorization": f"Bearer {create_access_token({'sub': email}, timedelta(hours=1))}"}
+            for email in emails
+        ]
+    finally:
+        db.close()
+
+def add_gathering(donor_id):
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        gathering = models.Gathering(
+            user_id=donor_id, food_details="popular drop", is_taken=False,
+            available_from=now - timedelta(hours=1), available_to=now + timedelta(hours=6),
+            latitude=12.97, longitude=77.59,
+        )
+        db.add(gathering)
+        db.commit()
+        return gathering.id
+    finally:
+        db.close()
+
+def claim_rows(gathering_id):
+    db = SessionLocal()
+    try:
+        return db.query(models.Claim).filter(models.Claim.gathering_id == gathering_id).count()
+    finally:
+        db.close()
+
+async def claim(client, headers, gathering_id):
+    start = time.perf_counter()
+    response = await client.post("/claims/", headers=headers, json={"gathering_id": gathering_id})
+    return response.status_code, time.perf_counter() - start
+
+async def run(recipients, rounds, max_latency):
+    transport = httpx.ASGITransport(app=main.app)
+    failed = False
+    async with main.app.router.lifespan_context(main.app):
+        # Seeded once the startup has created the schema
+        donor_id, tokens = seed(recipients)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            # Warm the user cache so the round measures claiming only
+            await asyncio.gather(*[client.get("/users/me", headers=headers) for headers in tokens])
+            for round_number in range(rounds):
+                gathering_id = add_gathering(donor_id)
+                start = time.perf_counter()
+                results = await asyncio.gather(*[claim(client, headers, gathering_id) for headers in tokens])
+                elapsed = time.perf_counter() - start
+
+                statuses = [status for status, _ in results]
+                latencies = sorted(latency for _, latency in results)
+                winners = statuses.count(200)
+                rows = claim_rows(gathering_id)
+                errors = len(statuses) - winners - statuses.count(400)
+                ok = winners == 1 and rows == 1 and errors == 0 and latencies[-1] <= max_latency
+                failed |= not ok
+                print(f"round {round_number}: {recipients} claims in {elapsed:.2f}s "
+                      f"({recipients / elapsed:.0f}/s), winners={winners}, claim rows={rows}, "
+                      f"errors={errors}, p50={latencies[len(latencies) // 2] * 1000:.1f}ms, "
+                      f"max={latencies[-1] * 1000:.1f}ms  {'ok' if ok else 'FAILED'}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--recipients", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-latency", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.recipients, args.rounds, args.max_latency))
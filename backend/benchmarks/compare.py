@@ -0,0 +1,49 @@
+"""
+Compare two api_bench.py result files, e.g. before and after a change.
+
+Matches results by dataset size, mode, scenario and concurrency, and prints
+throughput and p50/p95/p99 for both runs with the relative change.
+
+    cd backend && python benchmarks/compare.py before.json after.json
+"""
+import argparse
+import json
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return {
+        (r["size"], r["mode"], r["scenario"], r["concurrency"]): r
+        for r in report["results"]
+    }
+
+def change(before, after):
+    if before is None or after is None or before == 0:
+        return "     n/a"
+    return f"{(after - before) / before * 100:+7.1f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+    before, after = load(args.before), load(args.after)
+
+    print(f"{'size':>8} {'mode':<9} {'scenario':<8} {'c':>4}  " +
+          "  ".join(f"{metric:>28}" for metric in METRICS))
+    for key in sorted(before.keys() & after.keys()):
+        size, mode, scenario, concurrency = key
+        cells = [
+            f"{before[key][m]!s:>9} -> {after[key][m]!s:>9} {change(before[key][m], after[key][m])}"
+            for m in METRICS
+        ]
+        print(f"{size:>8} {mode:<9} {scenario:<8} {concurrency:>4}  " + "  ".join(cells))
+    for label, missing in (("only in before", before.keys() - after.keys()),
+                           ("only in after", after.keys() - before.keys())):
+        for key in sorted(missing):
+            print(f"{label}: size={key[0]} mode={key[1]} scenario={key[2]} c={key[3]}")
+
+if __name__ == "__main__":
+    main()
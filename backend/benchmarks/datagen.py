@@ -0,0 +1,144 @@
+"""
+Synthetic data for benchmarks: donors, recipients and gatherings spread over
+a city bounding box, and claims on some of the gatherings.
+
+Rows are inserted with executemany INSERTs and every user shares one bcrypt
+hash of PASSWORD, so a hundred thousand rows take seconds, not hours. Users
+are named donor<n>@example.com and recipient<n>@example.com; populate() adds
+to whatever is already there, so a dataset can be grown between runs.
+
+    cd backend && python benchmarks/datagen.py --database-url sqlite:///bench.db \\
+        [--donors 1000] [--recipients 5000] [--gatherings 10000] [--claims 1000]
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = "benchmark-password"
+
+# Bengaluru: min_lat, max_lat, min_lon, max_lon
+CITY = (12.83, 13.14, 77.46, 77.78)
+
+# Words for food_details, so text search has something to find
+FOODS = (
+    "rice", "dal", "roti", "chapati", "biryani", "idli", "dosa", "sambar", "curd", "bread", "buns",
+    "vegetable curry", "paneer", "chicken", "egg", "fruit", "bananas", "apples", "milk", "sandwiches",
+    "pulao", "khichdi", "upma", "poha", "snacks", "sweets", "salad", "soup", "noodles", "pasta",
+)
+QUALIFIERS = ("vegetarian", "vegan", "fresh", "homemade", "packed", "leftover", "spicy", "mild")
+
+def random_point(rng, city=CITY):
+    return rng.uniform(city[0], city[1]), rng.uniform(city[2], city[3])
+
+def food_details(rng):
+    """Text like: vegetarian rice, dal and curd for 12 people"""
+    foods = rng.sample(FOODS, rng.randint(1, 3))
+    dishes = foods[0] if len(foods) == 1 else ", ".join(foods[:-1]) + " and " + foods[-1]
+    qualifier = rng.choice(QUALIFIERS) + " " if rng.random() < 0.5 else ""
+    return f"{qualifier}{dishes} for {rng.randint(2, 50)} people"
+
+def populate(engine, donors=0, recipients=0, gatherings=0, claims=0, seed=0, city=CITY):
+    """
+    Add the given numbers of rows. Gatherings belong to random donors, are
+    open now and close within the next two days; claims take random open
+    gatherings for random recipients. Returns the row counts afterwards.
+    """
+    from sqlalchemy import bindparam, func, insert, select, update
+
+    import geo, models
+    from passwords import hash_password
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    models.Base.metadata.create_all(bind=engine)
+    users, gathering_table, claim_table = (
+        models.User.__table__, models.Gathering.__table__, models.Claim.__table__
+    )
+    with engine.begin() as conn:
+        def count(user_type):
+            return conn.scalar(select(func.count()).select_from(users).where(users.c.user_type == user_type))
+
+        password = hash_password(PASSWORD)
+        rows = []
+        for user_type, extra in (("donor", donors), ("recipient", recipients)):
+            first = count(user_type)
+            for n in range(first, first + extra):
+                latitude, longitude = random_point(rng, city)
+                email = f"{user_type}{n}@example.com"
+                rows.append(dict(name=email, email=email, password=password, user_type=user_type,
+                                 latitude=latitude, longitude=longitude))
+        if rows:
+            conn.execute(insert(users), rows)
+
+        donor_ids = conn.scalars(select(users.c.id).where(users.c.user_type == "donor")).all()
+        recipient_ids = conn.scalars(select(users.c.id).where(users.c.user_type == "recipient")).all()
+        if gatherings and not donor_ids:
+            raise ValueError("gatherings need at least one donor")
+        rows = []
+        for n in range(gatherings):
+            latitude, longitude = random_point(rng, city)
+            rows.append(dict(
+                user_id=rng.choice(donor_ids),
+                food_details=food_details(rng),
+                available_from=now - timedelta(minutes=rng.uniform(1, 240)),
+                available_to=now + timedelta(minutes=rng.uniform(30, 2880)),
+                latitude=latitude, longitude=longitude,
+                geohash=geo.encode(latitude, longitude),
+                is_taken=False,
+            ))
+        if rows:
+            conn.execute(insert(gathering_table), rows)
+
+        if claims:
+            if not recipient_ids:
+                raise ValueError("claims need at least one recipient")
+            open_ids = conn.scalars(
+                select(gathering_table.c.id).where(gathering_table.c.is_taken == False)
+            ).all()
+            taken = rng.sample(open_ids, min(claims, len(open_ids)))
+            if taken:
+                conn.execute(
+                    update(gathering_table)
+                    .where(gathering_table.c.id == bindparam("taken_id"))
+                    .values(is_taken=True),
+                    [{"taken_id": gathering_id} for gathering_id in taken]
+                )
+                conn.execute(insert(claim_table), [
+                    dict(gathering_id=gathering_id, recipient_id=rng.choice(recipient_ids),
+                         claim_time=now - timedelta(minutes=rng.uniform(0, 60)),
+                         status=rng.choice(("claimed", "claimed", "collected")))
+                    for gathering_id in taken
+                ])
+
+        return {
+            "donors": count("donor"),
+            "recipients": count("recipient"),
+            "gatherings": conn.scalar(select(func.count()).select_from(gathering_table)),
+            "claims": conn.scalar(select(func.count()).select_from(claim_table)),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--donors", type=int, default=1000)
+    parser.add_argument("--recipients", type=int, default=5000)
+    parser.add_argument("--gatherings", type=int, default=10000)
+    parser.add_argument("--claims", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    from database import get_engine_and_session
+    engine, _ = get_engine_and_session(args.database_url)
+    import models
+    from migrations import run_migrations
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    print(populate(engine, args.donors, args.recipients, args.gatherings, args.claims, args.seed))
+
+if __name__ == "__main__":
+    main()
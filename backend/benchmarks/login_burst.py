@@ -0,0 +1,93 @@
+"""
+Load test: does a burst of logins slow down /gatherings/nearby?
+
+Runs the app in-process against a throwaway SQLite file, measures nearby
+latency on its own and then while LOGINS concurrent /users/token requests
+are in flight, and prints both distributions.
+
+    cd backend && python benchmarks/login_burst.py [--logins 200] [--queries 200]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("RATE_LIMIT", "0")  # one client, many requests
+
+import httpx  # noqa: E402
+import main  # noqa: E402
+
+PASSWORD = "benchmark-password"
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+def summary(samples):
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+    }
+
+async def register(client, email, user_type):
+    await client.post("/users/register", json={
+        "name": email, "email": email, "password": PASSWORD,
+        "user_type": user_type, "latitude": 12.97, "longitude": 77.59,
+    })
+    response = await client.post("/users/token", data={"username": email, "password": PASSWORD})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def nearby_latencies(client, headers, queries):
+    latencies = []
+    for _ in range(queries):
+        start = time.perf_counter()
+        response = await client.get("/gatherings/nearby", headers=headers, params={
+            "latitude": 12.97, "longitude": 77.59, "max_distance": 5, "limit": 20,
+        })
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+async def login(client, email):
+    await client.post("/users/token", data={"username": email, "password": PASSWORD})
+
+async def run(logins, queries):
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            donor = await register(client, "donor@example.com", "donor")
+            recipient = await register(client, "recipient@example.com", "recipient")
+            now = datetime.now()
+            for i in range(200):
+                await client.post("/gatherings/", headers=donor, json={
+                    "food_details": f"meal {i}",
+                    "available_from": (now - timedelta(hours=1)).isoformat(),
+                    "available_to": (now + timedelta(hours=6)).isoformat(),
+                    "latitude": 12.9 + (i % 20) * 0.01,
+                    "longitude": 77.5 + (i // 20) * 0.01,
+                })
+
+            idle = await nearby_latencies(client, recipient, queries)
+
+            burst = [asyncio.create_task(login(client, "recipient@example.com")) for _ in range(logins)]
+            loaded = await nearby_latencies(client, recipient, queries)
+            await asyncio.gather(*burst)
+
+    print("nearby, idle:        ", summary(idle))
+    print(f"nearby, {logins} logins: ", summary(loaded))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.queries))
@@ -0,0 +1,74 @@
+"""
+Time the batch matcher on synthetic recipients and gatherings.
+
+Scatters RECIPIENTS and GATHERINGS uniformly over a city-sized box, runs
+matching.match() with each worker count, and checks a sample of recipients
+against a brute-force scan with haversine().
+
+    cd backend && python benchmarks/matching_scale.py [--recipients 30000] [--gatherings 30000] [--workers 1 4]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+import matching  # noqa: E402
+from distance import haversine  # noqa: E402
+
+CITY = (12.5, 13.5, 77.0, 78.0)  # min_lat, max_lat, min_lon, max_lon
+
+def scatter(count):
+    return [(i, random.uniform(CITY[0], CITY[1]), random.uniform(CITY[2], CITY[3]))
+            for i in range(1, count + 1)]
+
+def brute_force(recipient, gatherings, now):
+    _, latitude, longitude = recipient
+    scored = []
+    for gathering_id, lat, lon, available_to in gatherings:
+        distance = haversine(latitude, longitude, lat, lon)
+        if distance <= matching.MATCH_RADIUS_KM:
+            hours = (available_to - now).total_seconds() / 3600
+            urgency = 1 - min(max(hours / matching.URGENCY_HORIZON_HOURS, 0), 1)
+            score = ((1 - matching.URGENCY_WEIGHT) * (1 - distance / matching.MATCH_RADIUS_KM)
+                     + matching.URGENCY_WEIGHT * urgency)
+            scored.append((-score, distance, gathering_id))
+    return [gathering_id for _, _, gathering_id in sorted(scored)[:matching.MATCH_SUGGESTIONS]]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=30000)
+    parser.add_argument("--gatherings", type=int, default=30000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--check", type=int, default=50, help="recipients to verify")
+    args = parser.parse_args()
+
+    random.seed(0)
+    now = datetime.now()
+    recipients = scatter(args.recipients)
+    gatherings = [(i, lat, lon, now + timedelta(hours=random.uniform(0.5, 48)))
+                  for i, lat, lon in scatter(args.gatherings)]
+
+    result = None
+    for workers in args.workers:
+        started = time.perf_counter()
+        result = matching.match(recipients, gatherings, now, workers=workers)
+        print(f"workers={workers}: {time.perf_counter() - started:.2f}s for "
+              f"{len(recipients)} recipients x {len(gatherings)} gatherings, "
+              f"{len(result)} with suggestions")
+
+    mismatches = 0
+    for recipient in random.sample(recipients, min(args.check, len(recipients))):
+        expected = brute_force(recipient, gatherings, now)
+        got = [s.gathering_id for s in result.get(recipient[0], [])]
+        mismatches += expected != got
+    print(f"brute-force check: {mismatches} mismatches in {min(args.check, len(recipients))} recipients")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
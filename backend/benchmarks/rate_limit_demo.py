@@ -0,0 +1,168 @@
+"""
+Latency of well-behaved clients while others abuse the API, with and without
+rate limiting and load shedding (rate_limit.py).
+
+Runs the app against a throwaway SQLite file. --clients recipients each
+poll /gatherings/nearby every --interval seconds, which is within their
+budget. Meanwhile one recipient sends --abuse-rps requests a second to
+/gatherings/nearby, and a credential-stuffing run sends --stuff-rps wrong
+passwords a second to /users/token. The abuse is sent at a fixed rate
+whatever the responses, so both abuse phases offer the server the same
+load. Each phase lasts --seconds:
+
+    baseline     the polling clients alone
+    unprotected  with the abuse, RATE_LIMIT off
+    protected    with the abuse, RATE_LIMIT on
+
+For each phase the script prints the polling clients' latency percentiles and
+status codes, and the status codes the abusers got.
+
+--mode http (the default) starts `uvicorn main:app` for each phase and
+drives it over TCP. --mode inprocess drives main.app through httpx's ASGI
+transport. That is quicker to set up, but the abusers' own client work then
+runs in the server's event loop, which understates the protection.
+
+    cd backend && python benchmarks/rate_limit_demo.py [--clients 8] [--abuse-rps 100] \\
+        [--stuff-rps 10] [--mode http]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("MATCH_INTERVAL_SECONDS", "0")
+os.environ.setdefault("RESPONSE_CACHE_TTL", "0")  # every request does the work
+
+import httpx  # noqa: E402
+
+import datagen, live_index, models, rate_limit  # noqa: E402
+from api_bench import free_port, start_server  # noqa: E402
+from database import engine, SessionLocal  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from routers.users import create_access_token  # noqa: E402
+
+def percentile(sorted_values, q):
+    return sorted_values[max(0, int(q * len(sorted_values) + 0.5) - 1)] if sorted_values else None
+
+def auth(n):
+    token = create_access_token({"sub": f"recipient{n}@example.com"}, timedelta(hours=2))
+    return {"Authorization": f"Bearer {token}"}
+
+def nearby_params(rng):
+    latitude, longitude = datagen.random_point(rng)
+    return {"latitude": latitude, "longitude": longitude, "max_distance": 3, "limit": 50}
+
+async def poll(client, headers, interval, deadline, rng, latencies, statuses):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/gatherings/nearby", params=nearby_params(rng), headers=headers)
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed)
+        statuses[response.status_code] += 1
+        await asyncio.sleep(max(0.0, interval - elapsed))
+
+async def flood(send_request, rate, deadline, statuses):
+    """Call send_request() rate times a second until deadline, open loop."""
+    async def one():
+        try:
+            response = await send_request()
+            statuses[response.status_code] += 1
+        except httpx.HTTPError:
+            statuses["error"] += 1
+
+    in_flight = set()
+    next_at = time.monotonic()
+    while next_at < deadline:
+        await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+        next_at += 1 / rate
+        task = asyncio.create_task(one())
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    await asyncio.gather(*in_flight)
+
+async def phase(transport, base_url, args, abuse):
+    rng = random.Random(args.seed)
+    deadline = time.monotonic() + args.seconds
+    latencies, statuses, abuse_statuses = [], Counter(), Counter()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=120) as client:
+        tasks = [poll(client, auth(n), args.interval, deadline, rng, latencies, statuses)
+                 for n in range(args.clients)]
+        if abuse:
+            abuser = auth(args.clients)
+            tasks.append(flood(
+                lambda: client.get("/gatherings/nearby", params=nearby_params(rng), headers=abuser),
+                args.abuse_rps, deadline, abuse_statuses
+            ))
+            tasks.append(flood(
+                lambda: client.post("/users/token", data={
+                    "username": f"recipient{rng.randrange(100)}@example.com", "password": "wrong"
+                }),
+                args.stuff_rps, deadline, abuse_statuses
+            ))
+        await asyncio.gather(*tasks)
+    latencies.sort()
+    return latencies, statuses, abuse_statuses
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--gatherings", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between a client's polls")
+    parser.add_argument("--abuse-rps", type=float, default=100, help="/gatherings/nearby requests a second")
+    parser.add_argument("--stuff-rps", type=float, default=10, help="/users/token requests a second")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--mode", choices=("http", "inprocess"), default="http")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    print(datagen.populate(engine, donors=max(1, args.gatherings // 100), recipients=max(100, args.clients + 1),
+                           gatherings=args.gatherings, seed=args.seed))
+
+    if args.mode == "inprocess":
+        import main as app_module
+        db = SessionLocal()
+        try:
+            live_index.index.load(db)
+        finally:
+            db.close()
+
+    print(f"{'phase':<12} {'polls':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  client statuses / abuser statuses")
+    for name, abuse, limited in (("baseline", False, True), ("unprotected", True, False), ("protected", True, True)):
+        server = None
+        if args.mode == "inprocess":
+            rate_limit.RATE_LIMIT = limited
+            # Every phase starts with full buckets, and a new event loop
+            rate_limit.backend = rate_limit.InMemoryBuckets()
+            rate_limit.limiter = rate_limit.ConcurrencyLimiter(
+                rate_limit.MAX_CONCURRENT_REQUESTS, rate_limit.MAX_QUEUED_REQUESTS,
+                rate_limit.ADMISSION_TIMEOUT_SECONDS
+            )
+            transport, base_url = httpx.ASGITransport(app=app_module.app), "http://demo"
+        else:
+            os.environ["RATE_LIMIT"] = "1" if limited else "0"
+            port = free_port()
+            server = start_server(port)
+            transport, base_url = None, f"http://127.0.0.1:{port}"
+        try:
+            latencies, statuses, abuse_statuses = asyncio.run(phase(transport, base_url, args, abuse))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        ms = lambda seconds: f"{seconds * 1000:.1f}ms" if seconds is not None else "-"  # noqa: E731
+        print(f"{name:<12} {len(latencies):>6} {ms(percentile(latencies, 0.5)):>9} "
+              f"{ms(percentile(latencies, 0.95)):>9} {ms(percentile(latencies, 0.99)):>9} "
+              f"{ms(latencies[-1] if latencies else None):>9}  {dict(statuses)} / {dict(abuse_statuses)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Full-text gathering search (crud.search_gatherings on the gatherings_fts
+index) against the LIKE '%word%' scan it replaces.
+
+A synthetic dataset (datagen.py) of --gatherings gatherings is loaded into a
+temporary database. Each query is then timed --repeat times in four ways:
+the full-text search ranked by relevance, the same near a random point
+within 3 km, and a LIKE scan with the same filters for both. The scan is
+ordered by id, as it has no relevance to rank by. Match counts are printed
+for both methods. The full-text search matches word prefixes and the scan
+matches substrings, so the counts can differ slightly.
+
+    cd backend && python benchmarks/search_bench.py [--gatherings 100000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import and_, func  # noqa: E402
+
+import crud, datagen, geo, models  # noqa: E402
+from database import engine, SessionLocal  # noqa: E402
+from distance import GatheringPoints  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+QUERIES = ("rice", "paneer", "vegetarian biryani", "veg", "vegan dal roti", "sushi")
+RADIUS_KM = 3
+
+def like_filters(text, latitude=None, longitude=None):
+    filters = [models.Gathering.food_details.like(f"%{term}%") for term in crud.search_terms(text)]
+    filters.append(models.is_available(datetime.now()))
+    if latitude is not None:
+        min_lat, max_lat, min_lon, max_lon = geo.bounding_box(latitude, longitude, RADIUS_KM)
+        filters += [
+            models.Gathering.latitude.between(min_lat, max_lat),
+            models.Gathering.longitude.between(min_lon, max_lon),
+        ]
+    return and_(*filters)
+
+def like_search(db, text, latitude=None, longitude=None, limit=20):
+    query = db.query(models.Gathering.id, models.Gathering.latitude, models.Gathering.longitude).filter(
+        like_filters(text, latitude, longitude)
+    )
+    if latitude is None:
+        ids = [row.id for row in query.order_by(models.Gathering.id).limit(limit)]
+    else:
+        rows = query.all()
+        ids = [gathering_id for _, gathering_id in GatheringPoints.from_rows(
+            [(row.id, row.latitude, row.longitude) for row in rows]
+        ).nearest(latitude, longitude, RADIUS_KM, k=limit)]
+    return db.query(models.Gathering).filter(models.Gathering.id.in_(ids)).all() if ids else []
+
+def fts_count(db, text):
+    match, _ = crud._search_filter(db, crud.search_terms(text))
+    return db.query(func.count()).select_from(crud.GATHERINGS_FTS).filter(match).scalar()
+
+def like_count(db, text):
+    return db.query(func.count(models.Gathering.id)).filter(
+        and_(*[models.Gathering.food_details.like(f"%{term}%") for term in crud.search_terms(text)])
+    ).scalar()
+
+def timed(run, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--gatherings", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    started = time.perf_counter()
+    print(datagen.populate(engine, donors=max(1, args.gatherings // 100), gatherings=args.gatherings, seed=args.seed))
+    print(f"loaded in {time.perf_counter() - started:.1f}s, full-text index kept up to date by triggers")
+
+    rng = random.Random(args.seed)
+    db = SessionLocal()
+    try:
+        print(f"{'query':<20} {'fts hits':>8} {'like hits':>9} {'fts':>9} {'like':>9} "
+              f"{'fts near':>9} {'like near':>9}   (median ms)")
+        for text in QUERIES:
+            latitude, longitude = datagen.random_point(rng)
+            fts = timed(lambda: crud.search_gatherings(db, text), args.repeat)
+            like = timed(lambda: like_search(db, text), args.repeat)
+            fts_near = timed(lambda: crud.search_gatherings(
+                db, text, latitude=latitude, longitude=longitude, max_distance_km=RADIUS_KM
+            ), args.repeat)
+            like_near = timed(lambda: like_search(db, text, latitude, longitude), args.repeat)
+            print(f"{text:<20} {fts_count(db, text):>8} {like_count(db, text):>9} {fts:>9.2f} {like:>9.2f} "
+                  f"{fts_near:>9.2f} {like_near:>9.2f}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
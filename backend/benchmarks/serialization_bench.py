@@ -0,0 +1,121 @@
+"""
+Compare the fast serialization path of the list endpoints (column rows
+encoded with orjson, see serialization.py) against the response model path.
+
+A synthetic dataset (datagen.py) is loaded into a temporary database, then
+each endpoint is requested --requests times in-process with each path, with
+the response cache off. The two paths must return identical JSON, which is
+checked on every endpoint before timing.
+
+    cd backend && python benchmarks/serialization_bench.py [--gatherings 20000] [--requests 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("MATCH_INTERVAL_SECONDS", "0")
+os.environ.setdefault("RATE_LIMIT", "0")  # one client, many requests
+os.environ.setdefault("ARCHIVE_INTERVAL_SECONDS", "0")
+os.environ["RESPONSE_CACHE_TTL"] = "0"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+import datagen, live_index, models, serialization  # noqa: E402
+from database import engine, SessionLocal  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from routers.users import create_access_token  # noqa: E402
+
+def auth(email):
+    return {"Authorization": f"Bearer {create_access_token({'sub': email}, timedelta(hours=2))}"}
+
+def busiest_users():
+    # The recipient and the donor with the most claims, for the claim lists
+    claims, gatherings = models.Claim.__table__, models.Gathering.__table__
+    with engine.connect() as conn:
+        recipient = conn.execute(
+            select(claims.c.recipient_id).group_by(claims.c.recipient_id)
+            .order_by(func.count().desc()).limit(1)
+        ).scalar()
+        donor = conn.execute(
+            select(gatherings.c.user_id).join(claims, claims.c.gathering_id == gatherings.c.id)
+            .group_by(gatherings.c.user_id).order_by(func.count().desc()).limit(1)
+        ).scalar()
+        emails = dict(conn.execute(
+            select(models.User.id, models.User.email).where(models.User.id.in_([recipient, donor]))
+        ).all())
+    return emails[recipient], emails[donor]
+
+def endpoints(limit):
+    recipient, donor = busiest_users()
+    latitude = (datagen.CITY[0] + datagen.CITY[1]) / 2
+    longitude = (datagen.CITY[2] + datagen.CITY[3]) / 2
+    return [
+        ("list", "/gatherings/", {"limit": limit}, auth(recipient)),
+        ("list-sql", "/gatherings/", {"limit": limit}, auth(recipient)),
+        ("nearby", "/gatherings/nearby",
+         {"latitude": latitude, "longitude": longitude, "max_distance": 3, "limit": limit}, auth(recipient)),
+        ("my-donations", "/gatherings/my-donations", {"limit": limit}, auth(donor)),
+        ("my-claims", "/claims/my-claims", {"limit": limit}, auth(recipient)),
+        ("for-my-gatherings", "/claims/for-my-gatherings", {"limit": limit}, auth(donor)),
+    ]
+
+def timed(client, url, params, headers, requests):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url, params=params, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    latencies.sort()
+    return sum(latencies) / len(latencies), latencies[len(latencies) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--gatherings", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=100, help="page size")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    print(datagen.populate(engine, donors=max(1, args.gatherings // 200), recipients=max(1, args.gatherings // 100),
+                           gatherings=args.gatherings, claims=args.gatherings // 5, seed=args.seed))
+
+    import main as app_module
+    db = SessionLocal()
+    try:
+        live_index.index.load(db)
+    finally:
+        db.close()
+
+    with TestClient(app_module.app) as client:
+        print(f"{'endpoint':<18} {'items':>6} {'model mean':>11} {'fast mean':>10} {'model p50':>10} "
+              f"{'fast p50':>9} {'speedup':>8}")
+        for name, url, params, headers in endpoints(args.limit):
+            # list-sql is the gathering list read from the database instead
+            # of the live index
+            live_index.index.loaded = name != "list-sql"
+            results, bodies = {}, {}
+            for fast in (False, True):
+                serialization.FAST_SERIALIZATION = fast
+                response = client.get(url, params=params, headers=headers)
+                response.raise_for_status()
+                bodies[fast] = response.json()
+                results[fast] = timed(client, url, params, headers, args.requests)
+            if bodies[False] != bodies[True]:
+                sys.exit(f"{name}: the fast path returned different JSON")
+            live_index.index.loaded = True
+            (model_mean, model_p50), (fast_mean, fast_p50) = results[False], results[True]
+            print(f"{name:<18} {len(bodies[True]):>6} {model_mean * 1000:>9.2f}ms {fast_mean * 1000:>8.2f}ms "
+                  f"{model_p50 * 1000:>8.2f}ms {fast_p50 * 1000:>7.2f}ms {model_mean / fast_mean:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
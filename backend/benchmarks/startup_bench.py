@@ -0,0 +1,139 @@
+"""
+Worker cold start: time from process start until `uvicorn main:app` serves
+its first request, and the latency of the first requests after that.
+
+A synthetic dataset (datagen.py) of --gatherings gatherings is loaded into a
+temporary database and migrated once with `python -m migrations`. Then a
+fresh uvicorn process is started --runs times for each configuration:
+
+    migrate      MIGRATE_ON_STARTUP=1 WARMUP=0, the development default
+                 without the warm-up
+    no-migrate   MIGRATE_ON_STARTUP=0 WARMUP=0, migrated beforehand
+    warm         MIGRATE_ON_STARTUP=0 WARMUP=1, the recommended deployment
+
+The time to ready is measured by polling / every 5ms. Then one login, one
+nearby query, one search and one donation list are timed, in that order,
+and the startup phases are read from /metrics. Medians are printed. The
+background jobs are turned off, so that they do not compete with the first
+requests.
+
+    cd backend && python benchmarks/startup_bench.py [--gatherings 100000] [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+for name in ("MATCH_INTERVAL_SECONDS", "ARCHIVE_INTERVAL_SECONDS", "STATS_RECONCILE_INTERVAL_SECONDS",
+             "RATE_LIMIT", "RESPONSE_CACHE_TTL"):
+    os.environ[name] = "0"
+
+import httpx  # noqa: E402
+
+import datagen  # noqa: E402
+from api_bench import free_port  # noqa: E402
+from database import engine  # noqa: E402
+from routers.users import create_access_token  # noqa: E402
+
+CONFIGURATIONS = [
+    ("migrate", {"MIGRATE_ON_STARTUP": "1", "WARMUP": "0"}),
+    ("no-migrate", {"MIGRATE_ON_STARTUP": "0", "WARMUP": "0"}),
+    ("warm", {"MIGRATE_ON_STARTUP": "0", "WARMUP": "1"}),
+]
+
+def first_requests(client):
+    """Seconds taken by each of the first requests to the worker."""
+    donor, recipient = [
+        {"Authorization": f"Bearer {create_access_token({'sub': email}, timedelta(hours=1))}"}
+        for email in ("donor1@example.com", "recipient1@example.com")
+    ]
+    latitude = (datagen.CITY[0] + datagen.CITY[1]) / 2
+    longitude = (datagen.CITY[2] + datagen.CITY[3]) / 2
+    requests = [
+        ("login", lambda: client.post("/users/token", data={
+            "username": "donor0@example.com", "password": datagen.PASSWORD
+        })),
+        ("nearby", lambda: client.get("/gatherings/nearby", headers=recipient, params={
+            "latitude": latitude, "longitude": longitude, "max_distance": 3, "limit": 50
+        })),
+        ("search", lambda: client.get("/gatherings/search", headers=recipient, params={"q": "rice", "limit": 20})),
+        ("my-donations", lambda: client.get("/gatherings/my-donations", headers=donor, params={"limit": 50})),
+    ]
+    timings = {}
+    for name, send in requests:
+        start = time.perf_counter()
+        send().raise_for_status()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+def startup_phases(client):
+    phases = {}
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith("startup_phase_seconds{"):
+            phase = line.split('phase="')[1].split('"')[0]
+            phases[phase] = float(line.rsplit(" ", 1)[1])
+    return phases
+
+def boot(environment):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**os.environ, **environment},
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                try:
+                    client.get("/").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            timings = {"ready": time.perf_counter() - started}
+            timings.update(first_requests(client))
+            timings.update({f"phase:{phase}": seconds for phase, seconds in startup_phases(client).items()})
+            return timings
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--gatherings", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    subprocess.run([sys.executable, "-m", "migrations"], cwd=BACKEND_DIR, check=True)
+    print(datagen.populate(engine, donors=max(2, args.gatherings // 100), recipients=max(1, args.gatherings // 20),
+                           gatherings=args.gatherings, claims=args.gatherings // 10, seed=args.seed))
+    engine.dispose()
+
+    results = {}
+    for name, environment in CONFIGURATIONS:
+        samples = defaultdict(list)
+        for _ in range(args.runs):
+            for key, seconds in boot(environment).items():
+                samples[key].append(seconds)
+        results[name] = {key: statistics.median(values) for key, values in samples.items()}
+
+    keys = list(dict.fromkeys(key for timings in results.values() for key in timings))
+    print(f"{'(median ms)':<24}" + "".join(f"{name:>12}" for name, _ in CONFIGURATIONS))
+    for key in keys:
+        print(f"{key:<24}" + "".join(
+            f"{results[name][key] * 1000:>12.1f}" if key in results[name] else f"{'-':>12}"
+            for name, _ in CONFIGURATIONS
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Stats reads from the precomputed counters (stats.py) against the aggregate
+queries they replace, as the history grows.
+
+The dataset (datagen.py) is grown in --steps. Its rows are inserted directly,
+without crud, so after each step stats.reconcile() brings the counters up to
+date, and its time is printed too. Then each read is timed --repeat times:
+the totals, one donor's stats and the top donors, each answered from the
+counters and by COUNT/GROUP BY over the gatherings and claims tables. Both
+answers must agree.
+
+    cd backend && python benchmarks/stats_bench.py [--steps 10000,100000,300000] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import case, func, select  # noqa: E402
+
+import datagen, models, stats  # noqa: E402
+from database import engine, SessionLocal  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+def counts_query(donor_id=None):
+    """The counters of stats.COUNTERS by aggregating the base tables."""
+    gathering, claim = models.Gathering, models.Claim
+    posted = select(func.count()).select_from(gathering)
+    claims = select(
+        func.count(claim.id),
+        *[func.coalesce(func.sum(case((claim.status == status, 1), else_=0)), 0)
+          for status in stats.STATUS_COUNTERS]
+    ).join(gathering, gathering.id == claim.gathering_id)
+    if donor_id is not None:
+        posted = posted.where(gathering.user_id == donor_id)
+        claims = claims.where(gathering.user_id == donor_id)
+    return posted, claims
+
+def aggregate(db, donor_id=None):
+    posted, claims = counts_query(donor_id)
+    return (db.scalar(posted), *db.execute(claims).one())
+
+def aggregate_top(db, limit=10):
+    return db.execute(
+        select(models.Gathering.user_id, func.count())
+        .group_by(models.Gathering.user_id)
+        .order_by(func.count().desc(), models.Gathering.user_id).limit(limit)
+    ).all()
+
+def from_counters(row):
+    return tuple(row[name] for name in stats.COUNTERS)
+
+def timed(db, run, repeat):
+    samples = []
+    for _ in range(repeat):
+        db.expire_all()  # counter rows are read again, not taken from the session
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--steps", default="10000,100000,300000", help="gathering counts to grow the dataset to")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    print(f"{'gatherings':>10} {'reconcile':>10} {'totals':>8} {'agg':>8} {'donor':>8} {'agg':>8} "
+          f"{'top':>8} {'agg':>8}   (median ms)")
+    loaded = 0
+    for step, target in enumerate(int(n) for n in args.steps.split(",")):
+        datagen.populate(engine, donors=max(1, (target - loaded) // 100), recipients=max(1, (target - loaded) // 50),
+                         gatherings=target - loaded, claims=(target - loaded) // 5, seed=args.seed + step)
+        loaded = target
+        db = SessionLocal()
+        try:
+            reconcile = stats.reconcile(db, pause=0).seconds * 1000
+            donor_id = aggregate_top(db, 1)[0][0]
+            if from_counters(stats.summary(db)) != aggregate(db):
+                sys.exit("the totals differ from the aggregate")
+            if from_counters(stats.for_donor(db, donor_id)) != aggregate(db, donor_id):
+                sys.exit("the donor's stats differ from the aggregate")
+            if ([row["gatherings_posted"] for row in stats.top_donors(db)]
+                    != [n for _, n in aggregate_top(db)]):
+                sys.exit("the top donors differ from the aggregate")
+            results = [
+                timed(db, lambda: stats.summary(db), args.repeat),
+                timed(db, lambda: aggregate(db), args.repeat),
+                timed(db, lambda: stats.for_donor(db, donor_id), args.repeat),
+                timed(db, lambda: aggregate(db, donor_id), args.repeat),
+                timed(db, lambda: stats.top_donors(db), args.repeat),
+                timed(db, lambda: aggregate_top(db), args.repeat),
+            ]
+        finally:
+            db.close()
+        print(f"{target:>10} {reconcile:>10.1f} " + " ".join(f"{ms:>8.2f}" for ms in results))
+
+if __name__ == "__main__":
+    main()
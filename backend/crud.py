@@ -1,29 +1,34 @@
 from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from math import radians, cos, sin, asin, sqrt
-import models, schemas
-from passlib.context import CryptContext
+from types import SimpleNamespace
+from typing import List, Optional, Tuple
+import random
+import re
+import time
+from sqlalchemy.orm import Session, contains_eager, joinedload
+from sqlalchemy import Integer, String, column, func, and_, or_, insert, literal_column, table, update
+from sqlalchemy.exc import OperationalError
+from starlette.concurrency import run_in_threadpool
+import events, geo, live_index, models, response_cache, schemas, serialization, stats, user_cache
+from distance import GatheringPoints, haversine
+from passwords import hash_password, verify_password, verify_password_async
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Helper function to calculate distance between two lat/long points
-def haversine(lat1, lon1, lat2, lon2):
-    """
-    Calculate the great circle distance between two points 
-    on the earth (specified in decimal degrees)
-    """
-    # Convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    
-    # Haversine formula
-    dlon = lon2 - lon1 
-    dlat = lat2 - lat1 
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a)) 
-    # Radius of earth in kilometers is 6371
-    km = 6371 * c
-    return km
+# Keyset pagination: rows after the previous page's sort key, in key order
+def _keyset(query, model, after=None, limit=None, sort="id"):
+    if sort == "available_to":
+        if after is not None:
+            available_to, last_id = after
+            query = query.filter(or_(
+                model.available_to > available_to,
+                and_(model.available_to == available_to, model.id > last_id)
+            ))
+        query = query.order_by(model.available_to, model.id)
+    else:
+        if after is not None:
+            query = query.filter(model.id > after[0])
+        query = query.order_by(model.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
 
 # User operations
 def get_user(db: Session, user_id: int):
@@ -33,7 +38,7 @@ def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = hash_password(user.password)
     db_user = models.User(
         name=user.name,
         email=user.email,
@@ -51,7 +56,26 @@ def authenticate_user(db: Session, email: str, password: str):
     user = get_user_by_email(db, email)
     if not user:
         return False
-    if not pwd_context.verify(password, user.password):
+    if not verify_password(password, user.password):
+        return False
+    return user
+
+def _get_credentials(db: Session, email: str):
+    """(UserSnapshot, password hash) of the user with this email, or None."""
+    user = get_user_by_email(db, email)
+    credentials = (user_cache.UserSnapshot.from_model(user), user.password) if user else None
+    # End the read transaction: the session gives its connection back to the
+    # pool while bcrypt runs, so a login burst cannot starve other requests
+    db.rollback()
+    return credentials
+
+async def authenticate_user_async(db: Session, email: str, password: str):
+    # Neither the lookup nor bcrypt runs on the event loop
+    credentials = await run_in_threadpool(_get_credentials, db, email)
+    if credentials is None:
+        return False
+    user, hashed_password = credentials
+    if not await verify_password_async(password, hashed_password):
         return False
     return user
 
@@ -63,68 +87,248 @@ def create_gathering(db: Session, gathering: schemas.GatheringCreate, user_id: i
         is_taken=False
     )
     db.add(db_gathering)
+    stats.gathering_posted(db, user_id)
     db.commit()
     db.refresh(db_gathering)
+    live_index.index.upsert(db_gathering)
+    response_cache.invalidate("gatherings")
+    events.publish("gathering.created", db_gathering)
     return db_gathering
 
+def create_gatherings_bulk(db: Session, gatherings: List[schemas.GatheringCreate], user_id: int) -> List[int]:
+    """
+    Insert many gatherings in one transaction with a single executemany-style
+    INSERT, and return their ids in input order. Mapper events do not fire
+    for bulk inserts, so the geohash is filled in here.
+    """
+    if not gatherings:
+        return []
+    rows = []
+    for gathering in gatherings:
+        row = gathering.dict()
+        row.update(
+            user_id=user_id,
+            is_taken=False,
+            geohash=geo.encode(gathering.latitude, gathering.longitude)
+        )
+        rows.append(row)
+    ids = db.scalars(
+        insert(models.Gathering).returning(models.Gathering.id, sort_by_parameter_order=True),
+        rows
+    ).all()
+    stats.gathering_posted(db, user_id, len(ids))
+    db.commit()
+    created = [SimpleNamespace(id=gathering_id, **row) for gathering_id, row in zip(ids, rows)]
+    live_index.index.upsert_many(created)
+    response_cache.invalidate("gatherings")
+    for gathering in created:
+        events.publish("gathering.created", gathering)
+    return ids
+
 def get_gathering(db: Session, gathering_id: int):
     return db.query(models.Gathering).filter(models.Gathering.id == gathering_id).first()
 
-def get_available_gatherings(db: Session, skip: int = 0, limit: int = 100):
-    now = datetime.now()
-    return db.query(models.Gathering).filter(
-        and_(
-            models.Gathering.is_taken == False,
-            models.Gathering.available_from <= now,
-            models.Gathering.available_to >= now
+def get_gathering_detail(db: Session, gathering_id: int):
+    # Loads the donor in the same query, for GatheringDetail responses
+    return db.query(models.Gathering).options(
+        joinedload(models.Gathering.user)
+    ).filter(models.Gathering.id == gathering_id).first()
+
+def get_available_gatherings(db: Session, skip: int = 0, limit: int = 100,
+                             after: Optional[tuple] = None, sort: str = "id"):
+    # Served from the in-memory index once it is loaded
+    if live_index.index.loaded:
+        return live_index.index.available(db, skip=skip, limit=limit, after=after, sort=sort)
+
+    query = db.query(models.Gathering).filter(models.is_available(datetime.now()))
+    return _keyset(query, models.Gathering, after, sort=sort).offset(skip).limit(limit).all()
+
+def get_nearby_gatherings(db: Session, latitude: float, longitude: float, max_distance_km: float = 10,
+                          limit: Optional[int] = None, after: Optional[Tuple[float, int]] = None):
+    """
+    Return available gatherings within max_distance_km, nearest first.
+
+    Candidates are narrowed in SQL by bounding box and geohash cells, so only
+    gatherings in nearby cells reach the exact distance check. With limit,
+    only the k nearest are loaded; after=(distance, id) of the last item of
+    the previous page continues from there.
+    """
+    # Served from the in-memory index once it is loaded
+    if live_index.index.loaded:
+        return live_index.index.nearby(
+            db, latitude, longitude, max_distance_km, limit=limit, after=after
         )
-    ).offset(skip).limit(limit).all()
 
-def get_nearby_gatherings(db: Session, latitude: float, longitude: float, max_distance_km: float = 10):
-    # Get all available gatherings
     now = datetime.now()
+    min_lat, max_lat, min_lon, max_lon = geo.bounding_box(latitude, longitude, max_distance_km)
+    filters = [
+        models.is_available(now),
+        models.Gathering.latitude.between(min_lat, max_lat),
+        models.Gathering.longitude.between(min_lon, max_lon),
+    ]
+    cells = geo.covering_cells(min_lat, max_lat, min_lon, max_lon)
+    if cells:
+        filters.append(or_(*[
+            and_(models.Gathering.geohash >= low, models.Gathering.geohash < high)
+            for low, high in map(geo.cell_range, cells)
+        ]))
+
+    # Only fetch coordinates for the candidates, not whole ORM objects
+    candidates = db.query(
+        models.Gathering.id, models.Gathering.latitude, models.Gathering.longitude
+    ).filter(and_(*filters)).all()
+
+    # Exact distance filter and top-k selection in one vectorized pass
+    nearby = GatheringPoints.from_rows(candidates).nearest(
+        latitude, longitude, max_distance_km, k=limit, after=after
+    )
+    if not nearby:
+        return []
+
     gatherings = db.query(models.Gathering).filter(
-        and_(
-            models.Gathering.is_taken == False,
-            models.Gathering.available_from <= now,
-            models.Gathering.available_to >= now
-        )
+        models.Gathering.id.in_([gathering_id for _, gathering_id in nearby])
     ).all()
-    
-    # Filter gatherings by distance
+    by_id = {gathering.id: gathering for gathering in gatherings}
     nearby_gatherings = []
-    for gathering in gatherings:
-        distance = haversine(latitude, longitude, gathering.latitude, gathering.longitude)
-        if distance <= max_distance_km:
-            gathering.distance = distance  # Add distance attribute
-            nearby_gatherings.append(gathering)
-    
-    # Sort by distance
-    nearby_gatherings.sort(key=lambda x: x.distance)
+    for distance, gathering_id in nearby:
+        gathering = by_id[gathering_id]
+        gathering.distance = distance  # Add distance attribute
+        nearby_gatherings.append(gathering)
     return nearby_gatherings
 
+# Full-text search over food_details (gatherings_fts, see migrations.py)
+GATHERINGS_FTS = table("gatherings_fts", column("rowid", Integer), column("food_details", String))
+SEARCH_RANK = literal_column("bm25(gatherings_fts)")  # lower is a better match
+# The unary + stops SQLite from driving the join from the gatherings indexes
+# and probing the full-text table by rowid for each row, which re-runs the
+# MATCH every time. The match is evaluated once and gatherings are looked
+# up by primary key.
+SEARCH_JOIN = literal_column("+gatherings_fts.rowid") == models.Gathering.id
+SEARCH_MAX_TERMS = 8
+
+def search_terms(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())[:SEARCH_MAX_TERMS]
+
+def _search_filter(db: Session, terms):
+    if db.get_bind().dialect.name != "sqlite":
+        # No FTS5 table: a scan, and every match ranks the same
+        return and_(*[models.Gathering.food_details.ilike(f"%{term}%") for term in terms]), literal_column("0")
+    # Every term, each as a word prefix ("veg" finds "vegetarian")
+    expression = " ".join(f'"{term}"*' for term in terms)
+    return GATHERINGS_FTS.c.food_details.op("MATCH")(expression), SEARCH_RANK
+
+def search_gatherings(db: Session, text: str, latitude: Optional[float] = None, longitude: Optional[float] = None,
+                      max_distance_km: float = 10, sort: str = "relevance", skip: int = 0, limit: int = 20):
+    """
+    Return available gatherings whose food_details contain every word of
+    text, best match first, or nearest first with sort="distance".
+
+    The text match, the availability window and, with a location, the
+    bounding box are one query on the full-text index. Within the box, the
+    exact distance filter and the ordering run on (id, position, rank) rows
+    only. Only the returned page is loaded as objects, each with a score
+    (higher is a better match) and, with a location, its distance.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return []
+    match, rank = _search_filter(db, terms)
+    filters = [match, models.is_available(datetime.now())]
+    if latitude is not None:
+        min_lat, max_lat, min_lon, max_lon = geo.bounding_box(latitude, longitude, max_distance_km)
+        filters += [
+            models.Gathering.latitude.between(min_lat, max_lat),
+            models.Gathering.longitude.between(min_lon, max_lon),
+        ]
+    query = db.query(
+        models.Gathering.id, models.Gathering.latitude, models.Gathering.longitude, rank.label("rank")
+    ).filter(*filters)
+    if rank is SEARCH_RANK:
+        query = query.join(GATHERINGS_FTS, SEARCH_JOIN)
+
+    if latitude is None:
+        rows = query.order_by(rank, models.Gathering.id).offset(skip).limit(limit).all()
+        hits = [(row.id, row.rank, None) for row in rows]
+    else:
+        rows = query.all()
+        ranks = {row.id: row.rank for row in rows}
+        nearby = GatheringPoints.from_rows(
+            [(row.id, row.latitude, row.longitude) for row in rows]
+        ).nearest(latitude, longitude, max_distance_km)
+        hits = [(gathering_id, ranks[gathering_id], distance) for distance, gathering_id in nearby]
+        if sort == "relevance":
+            hits.sort(key=lambda hit: (hit[1], hit[2], hit[0]))
+        hits = hits[skip:skip + limit]  # nearest() already ordered them by distance
+    if not hits:
+        return []
+
+    by_id = {
+        gathering.id: gathering for gathering in
+        db.query(models.Gathering).filter(models.Gathering.id.in_([hit[0] for hit in hits])).all()
+    }
+    results = []
+    for gathering_id, hit_rank, distance in hits:
+        gathering = by_id[gathering_id]
+        gathering.score = -hit_rank
+        gathering.distance = distance
+        results.append(gathering)
+    return results
+
 # Claim operations
+CLAIM_MAX_ATTEMPTS = 5
+CLAIM_BACKOFF_SECONDS = 0.02
+
+def _is_lock_error(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return "database is locked" in message or "database is busy" in message
+
 def create_claim(db: Session, claim: schemas.ClaimCreate, recipient_id: int):
-    # Check if gathering exists and is not already taken
-    gathering = get_gathering(db, claim.gathering_id)
-    if not gathering:
-        return None
-    if gathering.is_taken:
-        return None
-    
-    # Create claim and mark gathering as taken
-    db_claim = models.Claim(
-        gathering_id=claim.gathering_id,
-        recipient_id=recipient_id,
-        claim_time=datetime.now(),
-        status="claimed"
-    )
-    
-    gathering.is_taken = True
-    
-    db.add(db_claim)
-    db.commit()
+    """
+    Claim a gathering for a recipient, or return None if it does not exist
+    or is already taken.
+
+    The gathering is marked taken with a conditional UPDATE and the claim is
+    inserted in the same transaction, so exactly one of any number of
+    concurrent claims can win. Lock errors are retried with jittered
+    exponential backoff.
+    """
+    for attempt in range(CLAIM_MAX_ATTEMPTS):
+        try:
+            gathering = db.execute(
+                update(models.Gathering)
+                .where(
+                    models.Gathering.id == claim.gathering_id,
+                    models.Gathering.is_taken == False
+                )
+                .values(is_taken=True)
+                .returning(*models.Gathering.__table__.columns)
+                .execution_options(synchronize_session=False)
+            ).first()
+            if gathering is None:
+                # Missing, or another recipient got there first
+                db.rollback()
+                return None
+
+            db_claim = models.Claim(
+                gathering_id=claim.gathering_id,
+                recipient_id=recipient_id,
+                claim_time=datetime.now(),
+                status="claimed"
+            )
+            db.add(db_claim)
+            stats.claim_created(db, gathering.user_id)
+            db.commit()
+            break
+        except OperationalError as error:
+            db.rollback()
+            if not _is_lock_error(error) or attempt == CLAIM_MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(CLAIM_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5))
+
     db.refresh(db_claim)
+    live_index.index.discard(claim.gathering_id)
+    response_cache.invalidate("gatherings", f"gathering:{claim.gathering_id}", "claims")
+    events.publish("gathering.claimed", gathering)
     return db_claim
 
 def update_claim_status(db: Session, claim_id: int, status: str):
@@ -132,18 +336,100 @@ def update_claim_status(db: Session, claim_id: int, status: str):
     if not db_claim:
         return None
     
+    gathering = get_gathering(db, db_claim.gathering_id)
+    changed = db_claim.status != status
+
     # If cancelling claim, mark gathering as available again
-    if status == "cancelled" and db_claim.status != "cancelled":
-        gathering = get_gathering(db, db_claim.gathering_id)
+    reopened = status == "cancelled" and db_claim.status != "cancelled"
+    if reopened:
         gathering.is_taken = False
     
+    if changed:
+        stats.claim_status_changed(db, gathering.user_id, db_claim.status, status)
     db_claim.status = status
     db.commit()
     db.refresh(db_claim)
+    response_cache.invalidate("gatherings", f"gathering:{gathering.id}", "claims")
+    if reopened:
+        db.refresh(gathering)
+        live_index.index.upsert(gathering)
+        events.publish("gathering.available", gathering)
+    elif changed:
+        events.publish(f"gathering.{status}", gathering)
     return db_claim
 
-def get_user_claims(db: Session, user_id: int):
-    return db.query(models.Claim).filter(models.Claim.recipient_id == user_id).all()
+def get_user_claims(db: Session, user_id: int, limit: Optional[int] = None, after: Optional[tuple] = None):
+    # Gathering and recipient are loaded in the same query, for ClaimDetail
+    query = db.query(models.Claim).options(
+        joinedload(models.Claim.gathering),
+        joinedload(models.Claim.recipient)
+    ).filter(models.Claim.recipient_id == user_id)
+    return _keyset(query, models.Claim, after, limit).all()
+
+def get_claims_for_donor(db: Session, donor_id: int, limit: Optional[int] = None, after: Optional[tuple] = None):
+    # Claims on any of the donor's gatherings, as one join
+    query = db.query(models.Claim).join(models.Claim.gathering).options(
+        contains_eager(models.Claim.gathering),
+        joinedload(models.Claim.recipient)
+    ).filter(models.Gathering.user_id == donor_id)
+    return _keyset(query, models.Claim, after, limit).all()
+
+def get_user_gatherings(db: Session, user_id: int, limit: Optional[int] = None, after: Optional[tuple] = None):
+    query = db.query(models.Gathering).filter(models.Gathering.user_id == user_id)
+    return _keyset(query, models.Gathering, after, limit).all()
+
+# Row reads for the fast serialization path: the same queries as above, but
+# returning plain dicts shaped like the response schemas (see serialization.py)
+GATHERING_COLUMNS = [getattr(models.Gathering, field) for field in serialization.GATHERING_FIELDS]
+USER_COLUMNS = [getattr(models.User, field) for field in serialization.USER_FIELDS]
+CLAIM_COLUMNS = [getattr(models.Claim, field) for field in serialization.CLAIM_FIELDS]
+
+def _gathering_rows(query):
+    fields = serialization.GATHERING_FIELDS
+    return [dict(zip(fields, row)) for row in query.all()]
+
+def _claim_detail_rows(query):
+    claim_fields, gathering_fields, user_fields = (
+        serialization.CLAIM_FIELDS, serialization.GATHERING_FIELDS, serialization.USER_FIELDS
+    )
+    gathering_end = len(claim_fields) + len(gathering_fields)
+    rows = []
+    for row in query.all():
+        claim = dict(zip(claim_fields, row))
+        claim["gathering"] = dict(zip(gathering_fields, row[len(claim_fields):gathering_end]))
+        claim["recipient"] = dict(zip(user_fields, row[gathering_end:]))
+        rows.append(claim)
+    return rows
+
+def get_available_gathering_rows(db: Session, skip: int = 0, limit: int = 100,
+                                 after: Optional[tuple] = None, sort: str = "id"):
+    if live_index.index.loaded:
+        return [serialization.gathering_dict(snapshot) for snapshot in
+                live_index.index.available(db, skip=skip, limit=limit, after=after, sort=sort)]
+    query = db.query(*GATHERING_COLUMNS).filter(models.is_available(datetime.now()))
+    return _gathering_rows(_keyset(query, models.Gathering, after, sort=sort).offset(skip).limit(limit))
+
+def get_nearby_gathering_rows(db: Session, latitude: float, longitude: float, max_distance_km: float = 10,
+                              limit: Optional[int] = None, after: Optional[Tuple[float, int]] = None):
+    # At most limit rows, so the ORM/snapshot objects are kept and only the
+    # validation is skipped
+    return [
+        serialization.gathering_dict(gathering, distance=True)
+        for gathering in get_nearby_gatherings(db, latitude, longitude, max_distance_km, limit, after)
+    ]
+
+def get_user_gathering_rows(db: Session, user_id: int, limit: Optional[int] = None, after: Optional[tuple] = None):
+    query = db.query(*GATHERING_COLUMNS).filter(models.Gathering.user_id == user_id)
+    return _gathering_rows(_keyset(query, models.Gathering, after, limit))
+
+def get_user_claim_rows(db: Session, user_id: int, limit: Optional[int] = None, after: Optional[tuple] = None):
+    query = db.query(*CLAIM_COLUMNS, *GATHERING_COLUMNS, *USER_COLUMNS).join(
+        models.Claim.gathering
+    ).join(models.Claim.recipient).filter(models.Claim.recipient_id == user_id)
+    return _claim_detail_rows(_keyset(query, models.Claim, after, limit))
 
-def get_user_gatherings(db: Session, user_id: int):
-    return db.query(models.Gathering).filter(models.Gathering.user_id == user_id).all()
\ No newline at end of file
+def get_claim_rows_for_donor(db: Session, donor_id: int, limit: Optional[int] = None, after: Optional[tuple] = None):
+    query = db.query(*CLAIM_COLUMNS, *GATHERING_COLUMNS, *USER_COLUMNS).join(
+        models.Claim.gathering
+    ).join(models.Claim.recipient).filter(models.Gathering.user_id == donor_id)
+    return _claim_detail_rows(_keyset(query, models.Claim, after, limit))
@@ -0,0 +1,86 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud, models, schemas
+from passwords import hash_password_async, verify_password_async
+
+# Async equivalents of the crud functions, for use with database.get_async_db.
+# The queries live in crud: each function runs its sync counterpart on the
+# AsyncSession through run_sync, so both stacks share one implementation and
+# the async driver still does the I/O. Password hashing is the exception, as
+# it must be awaited on the password pool rather than blocking the loop.
+
+# User operations
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.get_user, user_id)
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.run_sync(crud.get_user_by_email, email)
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    hashed_password = await hash_password_async(user.password)
+    db_user = models.User(
+        name=user.name,
+        email=user.email,
+        password=hashed_password,
+        user_type=user.user_type,
+        latitude=user.latitude,
+        longitude=user.longitude
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email)
+    if not user:
+        return False
+    if not await verify_password_async(password, user.password):
+        return False
+    return user
+
+# Gathering operations
+async def create_gathering(db: AsyncSession, gathering: schemas.GatheringCreate, user_id: int):
+    return await db.run_sync(crud.create_gathering, gathering, user_id)
+
+async def get_gathering(db: AsyncSession, gathering_id: int):
+    return await db.run_sync(crud.get_gathering, gathering_id)
+
+async def get_gathering_detail(db: AsyncSession, gathering_id: int):
+    return await db.run_sync(crud.get_gathering_detail, gathering_id)
+
+async def get_available_gatherings(db: AsyncSession, skip: int = 0, limit: int = 100,
+                                   after=None, sort: str = "id"):
+    return await db.run_sync(crud.get_available_gatherings, skip, limit, after, sort)
+
+async def get_nearby_gatherings(db: AsyncSession, latitude: float, longitude: float,
+                                max_distance_km: float = 10, limit=None, after=None):
+    return await db.run_sync(
+        crud.get_nearby_gatherings, latitude, longitude, max_distance_km, limit, after
+    )
+
+async def get_user_gatherings(db: AsyncSession, user_id: int, limit=None, after=None):
+    return await db.run_sync(crud.get_user_gatherings, user_id, limit, after)
+
+async def get_available_gathering_rows(db: AsyncSession, skip: int = 0, limit: int = 100,
+                                       after=None, sort: str = "id"):
+    return await db.run_sync(crud.get_available_gathering_rows, skip, limit, after, sort)
+
+async def get_nearby_gathering_rows(db: AsyncSession, latitude: float, longitude: float,
+                                    max_distance_km: float = 10, limit=None, after=None):
+    return await db.run_sync(
+        crud.get_nearby_gathering_rows, latitude, longitude, max_distance_km, limit, after
+    )
+
+# Claim operations
+async def create_claim(db: AsyncSession, claim: schemas.ClaimCreate, recipient_id: int):
+    return await db.run_sync(crud.create_claim, claim, recipient_id)
+
+async def update_claim_status(db: AsyncSession, claim_id: int, status: str):
+    return await db.run_sync(crud.update_claim_status, claim_id, status)
+
+async def get_user_claims(db: AsyncSession, user_id: int, limit=None, after=None):
+    return await db.run_sync(crud.get_user_claims, user_id, limit, after)
+
+async def get_claims_for_donor(db: AsyncSession, donor_id: int, limit=None, after=None):
+    return await db.run_sync(crud.get_claims_for_donor, donor_id, limit, after)
@@ -0,0 +1,160 @@
+from itertools import repeat
+from math import radians, cos, sin, asin, sqrt, pow
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+# NumPy's square and arcsin are not always bit-identical to libm's pow and
+# asin, so vectorized distances can differ from haversine() in the last few
+# ulps. Any value within this margin of a cut-off (max distance, cursor, k-th
+# nearest) is recomputed exactly, and so are the returned distances, so
+# results match haversine() bit for bit.
+EXACT_MARGIN_KM = 1e-8
+
+# Upper bound on the size of a recipients x gatherings distance matrix
+MAX_MATRIX_CELLS = 4_000_000
+
+# Helper function to calculate distance between two lat/long points
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Calculate the great circle distance between two points
+    on the earth (specified in decimal degrees)
+    """
+    # Convert decimal degrees to radians
+    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+
+    # Haversine formula
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * asin(sqrt(a))
+    # Radius of earth in kilometers is 6371
+    km = EARTH_RADIUS_KM * c
+    return km
+
+def _haversine_rad(lat1, lon1, cos_lat1, lat2, lon2, cos_lat2):
+    # Same operation order as haversine(), on arrays of radians
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + cos_lat1 * cos_lat2 * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * (2 * np.arcsin(np.sqrt(a)))
+
+def _libm(function, values, *args):
+    """function, a math module function, applied to each value."""
+    return np.fromiter(map(function, values.tolist(), *args), np.float64, len(values))
+
+class GatheringPoints:
+    """
+    Gathering coordinates as contiguous float64 arrays, for answering
+    "which gatherings are near this point" in one vectorized pass.
+    """
+
+    def __init__(self, ids, latitudes, longitudes):
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        self.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        self._lat_rad = np.radians(self.latitudes)
+        self._lon_rad = np.radians(self.longitudes)
+        self._cos_lat = np.cos(self._lat_rad)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (id, latitude, longitude) rows."""
+        if not rows:
+            return cls([], [], [])
+        ids, latitudes, longitudes = zip(*rows)
+        return cls(ids, latitudes, longitudes)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def distances(self, latitude, longitude):
+        """Distance in km from one point to every gathering."""
+        lat = radians(latitude)
+        return _haversine_rad(
+            lat, radians(longitude), cos(lat),
+            self._lat_rad, self._lon_rad, self._cos_lat
+        )
+
+    def distance_matrix(self, latitudes, longitudes):
+        """Distances in km, one row per query point, one column per gathering."""
+        lat = np.radians(np.asarray(latitudes, dtype=np.float64))[:, None]
+        lon = np.radians(np.asarray(longitudes, dtype=np.float64))[:, None]
+        return _haversine_rad(
+            lat, lon, np.cos(lat),
+            self._lat_rad[None, :], self._lon_rad[None, :], self._cos_lat[None, :]
+        )
+
+    def nearest(self, latitude, longitude, max_distance_km, k=None, after=None):
+        """
+        Return [(distance, id)] of gatherings within max_distance_km, nearest
+        first, at most k of them. after=(distance, id) skips everything up to
+        and including that position, for cursor pagination.
+        """
+        if not len(self):
+            return []
+        return self._select(latitude, longitude, self.distances(latitude, longitude),
+                            max_distance_km, k, after)
+
+    def nearest_batch(self, latitudes, longitudes, max_distance_km, k=None):
+        """
+        Answer nearest() for many query points at once. Distances are computed
+        as a matrix, in row chunks bounded by MAX_MATRIX_CELLS.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        if not len(self):
+            return [[] for _ in range(len(latitudes))]
+        chunk = max(1, MAX_MATRIX_CELLS // len(self))
+        results = []
+        for start in range(0, len(latitudes), chunk):
+            lats = latitudes[start:start + chunk]
+            lons = longitudes[start:start + chunk]
+            matrix = self.distance_matrix(lats, lons)
+            for row, lat, lon in zip(matrix, lats.tolist(), lons.tolist()):
+                results.append(self._select(lat, lon, row, max_distance_km, k, None))
+        return results
+
+    def _exact(self, latitude, longitude, rows):
+        """
+        haversine() of the given rows, bit for bit. The squares and the
+        arcsine are libm's, called on each value; the other steps are NumPy,
+        which computes them identically.
+        """
+        lat = radians(latitude)
+        sin_dlat = np.sin((self._lat_rad[rows] - lat) / 2)
+        sin_dlon = np.sin((self._lon_rad[rows] - radians(longitude)) / 2)
+        a = _libm(pow, sin_dlat, repeat(2)) + cos(lat) * self._cos_lat[rows] * _libm(pow, sin_dlon, repeat(2))
+        return EARTH_RADIUS_KM * (2 * _libm(asin, np.sqrt(a)))
+
+    def _select(self, latitude, longitude, d, max_distance_km, k, after):
+        # Recompute values close to a cut-off exactly so every comparison
+        # below agrees with haversine()
+        near_cutoff = np.abs(d - max_distance_km) <= EXACT_MARGIN_KM
+        if after is not None:
+            near_cutoff |= np.abs(d - after[0]) <= EXACT_MARGIN_KM
+        if near_cutoff.any():
+            d = d.copy()
+            rows = np.flatnonzero(near_cutoff)
+            d[rows] = self._exact(latitude, longitude, rows)
+
+        mask = d <= max_distance_km
+        if after is not None:
+            after_distance, after_id = after
+            mask &= (d > after_distance) | ((d == after_distance) & (self.ids > after_id))
+        index = np.flatnonzero(mask)
+
+        # Top-k without a full sort; keep everything within the margin of the
+        # k-th distance so near-ties are ordered by the exact values
+        if k is not None and len(index) > k:
+            candidates = d[index]
+            kth = candidates[np.argpartition(candidates, k - 1)[k - 1]]
+            index = index[candidates <= kth + 2 * EXACT_MARGIN_KM]
+
+        # Exact distances of the selected rows, nearest first, then lowest id
+        exact = self._exact(latitude, longitude, index)
+        order = np.lexsort((self.ids[index], exact))
+        if k is not None:
+            order = order[:k]
+        return list(zip(exact[order].tolist(), self.ids[index[order]].tolist()))
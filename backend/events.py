@@ -0,0 +1,136 @@
+import asyncio
+import importlib
+import os
+import threading
+
+import geo, schemas
+from distance import haversine
+
+# In-process pub/sub for the real-time gathering feed (routers/feed.py).
+#
+# crud publishes an event whenever a gathering is created, claimed or changes
+# claim status. Subscribers register a location and radius and are bucketed
+# by the geohash cells their circle overlaps, so an event is only matched
+# against the subscribers in its own cell rather than every open connection.
+#
+# Delivery within a process goes through the broker. To fan out across
+# several workers, set EVENTS_BACKEND to "module:Class" naming a backend with
+# start(dispatch) and publish(event): publish() sends the event to the shared
+# channel (Redis, Postgres NOTIFY, ...) and every worker's backend calls
+# dispatch(event) for each event it receives. Events are plain dicts of
+# JSON-serializable values.
+
+FEED_CELL_PRECISION = 5  # ~4.9km x 4.9km buckets
+FEED_MAX_CELLS = 64      # subscribers covering more cells are checked on every event
+FEED_QUEUE_SIZE = 256
+
+RESYNC = {"type": "resync", "data": "null"}
+
+class Subscription:
+    def __init__(self, latitude, longitude, radius_km, loop, queue_size=FEED_QUEUE_SIZE):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+        self.cells = None
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=queue_size)
+
+    def matches(self, event):
+        return haversine(self.latitude, self.longitude,
+                         event["latitude"], event["longitude"]) <= self.radius_km
+
+    def deliver(self, event):
+        # Called from whichever thread ran the write; hand over to the loop
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # loop already closed, subscriber is going away
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow consumer gets one resync marker instead of a backlog
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(RESYNC)
+
+    async def get(self):
+        return await self._queue.get()
+
+class Broker:
+    def __init__(self):
+        self._buckets = {}  # geohash cell -> set of subscriptions
+        self._wide = set()  # subscriptions too large to bucket
+        self._lock = threading.Lock()
+        self.subscriber_count = 0
+
+    def subscribe(self, latitude, longitude, radius_km):
+        subscription = Subscription(latitude, longitude, radius_km, asyncio.get_running_loop())
+        box = geo.bounding_box(latitude, longitude, radius_km)
+        subscription.cells = geo.cells_at_precision(*box, FEED_CELL_PRECISION, FEED_MAX_CELLS)
+        with self._lock:
+            if subscription.cells is None:
+                self._wide.add(subscription)
+            else:
+                for cell in subscription.cells:
+                    self._buckets.setdefault(cell, set()).add(subscription)
+            self.subscriber_count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.cells is None:
+                self._wide.discard(subscription)
+            else:
+                for cell in subscription.cells:
+                    bucket = self._buckets.get(cell)
+                    if bucket is not None:
+                        bucket.discard(subscription)
+                        if not bucket:
+                            del self._buckets[cell]
+            self.subscriber_count -= 1
+
+    def dispatch(self, event):
+        cell = geo.encode(event["latitude"], event["longitude"], FEED_CELL_PRECISION)
+        with self._lock:
+            candidates = list(self._buckets.get(cell, ())) + list(self._wide)
+        for subscription in candidates:
+            if subscription.matches(event):
+                subscription.deliver(event)
+
+class InProcessBackend:
+    """Delivers events to the subscribers of this process only."""
+
+    local = True
+
+    def start(self, dispatch):
+        self._dispatch = dispatch
+
+    def publish(self, event):
+        self._dispatch(event)
+
+def _load_backend():
+    spec = os.environ.get("EVENTS_BACKEND")
+    if not spec:
+        return InProcessBackend()
+    module_name, class_name = spec.split(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+broker = Broker()
+backend = _load_backend()
+backend.start(broker.dispatch)
+
+def publish(event_type, gathering):
+    """
+    Publish a change to a gathering: "gathering.created", "gathering.claimed",
+    "gathering.available" or "gathering.collected".
+    """
+    if getattr(backend, "local", False) and not broker.subscriber_count:
+        return
+    backend.publish({
+        "type": event_type,
+        "latitude": gathering.latitude,
+        "longitude": gathering.longitude,
+        "data": schemas.GatheringResponse.from_orm(gathering).json(),
+    })
@@ -0,0 +1,107 @@
+from math import cos, radians, ceil, floor
+
+# Geohash helpers used to index gatherings spatially.
+# Every gathering stores a geohash at GEOHASH_PRECISION; a geohash prefix is
+# the cell that contains it, so "all gatherings in cell X" is a range scan on
+# the indexed geohash column.
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+GEOHASH_PRECISION = 9  # ~5m x 5m cells
+MAX_COVERING_CELLS = 16
+KM_PER_DEGREE = 6371 * radians(1)  # same earth radius as crud.haversine
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    value = 0
+    bit = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(_BASE32[value])
+            value = 0
+            bit = 0
+    return "".join(chars)
+
+def cell_size(precision):
+    """Return the (lat, lon) size in degrees of a geohash cell."""
+    lon_bits = ceil(precision * 5 / 2)
+    lat_bits = floor(precision * 5 / 2)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Return (min_lat, max_lat, min_lon, max_lon) enclosing every point within
+    radius_km of the given point. The box is conservative: it may contain
+    points further away, never fewer.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat = max(latitude - dlat, -90.0)
+    max_lat = min(latitude + dlat, 90.0)
+    # Longitude degrees shrink towards the poles, so widen the box using the
+    # latitude edge closest to a pole.
+    widest = max(abs(min_lat), abs(max_lat))
+    if widest >= 89.9:
+        return min_lat, max_lat, -180.0, 180.0
+    dlon = dlat / cos(radians(widest))
+    if longitude - dlon < -180.0 or longitude + dlon > 180.0:
+        # Box wraps the antimeridian; fall back to the full longitude range
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, longitude - dlon, longitude + dlon
+
+def cells_at_precision(min_lat, max_lat, min_lon, max_lon, precision, max_cells=MAX_COVERING_CELLS):
+    """
+    Return the geohash cells of the given precision covering the box, or
+    None if that takes more than max_cells cells.
+    """
+    lat_step, lon_step = cell_size(precision)
+    lat_first = floor((min_lat + 90.0) / lat_step)
+    lat_last = floor((max_lat + 90.0) / lat_step)
+    lon_first = floor((min_lon + 180.0) / lon_step)
+    lon_last = floor((max_lon + 180.0) / lon_step)
+    if (lat_last - lat_first + 1) * (lon_last - lon_first + 1) > max_cells:
+        return None
+    cells = set()
+    for i in range(lat_first, lat_last + 1):
+        for j in range(lon_first, lon_last + 1):
+            # Encode the centre of each cell, clamped inside the globe
+            lat = min(-90.0 + (i + 0.5) * lat_step, 90.0 - lat_step / 2)
+            lon = min(-180.0 + (j + 0.5) * lon_step, 180.0 - lon_step / 2)
+            cells.add(encode(lat, lon, precision))
+    return sorted(cells)
+
+def covering_cells(min_lat, max_lat, min_lon, max_lon, max_cells=MAX_COVERING_CELLS):
+    """
+    Return the geohash cells covering the box, using the finest precision
+    that needs at most max_cells cells. Returns None when the box is too
+    large to be worth a cell filter.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cells = cells_at_precision(min_lat, max_lat, min_lon, max_lon, precision, max_cells)
+        if cells is not None:
+            return cells
+    return None
+
+def cell_range(cell):
+    """Return the [low, high) string range of geohashes inside a cell."""
+    return cell, cell + "~"
@@ -0,0 +1,322 @@
+import bisect
+import heapq
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, func, or_
+
+import models, response_cache
+from database import SessionLocal
+from distance import GatheringPoints
+
+# Process-local index of open gatherings, so the availability read paths do
+# not have to query the database. It is loaded at startup and kept current by
+# the crud write functions. Each worker process has its own copy, so writes
+# made by other workers are picked up from the primary by reads:
+#
+#   sync    at most every LIVE_INDEX_SYNC_SECONDS, the gatherings and claims
+#           with ids above the last ones seen, in two primary key range
+#           queries: new gatherings are added, and newly claimed ones
+#           updated from their current row
+#   reload  every LIVE_INDEX_MAX_AGE seconds, a full load, which also picks
+#           up what sync does not see: gatherings reopened by a cancelled
+#           claim, and ids committed out of order (not SQLite, which commits
+#           one writer at a time)
+#
+# LIVE_INDEX_CHECK=1 compares every read against SQL, for tests.
+
+def _naive(value):
+    # Stored datetimes are naive; drop any offset a request carried so heap
+    # and window comparisons never mix naive and aware values
+    return value.replace(tzinfo=None) if value.tzinfo is not None else value
+
+@dataclass(frozen=True)
+class GatheringSnapshot:
+    id: int
+    user_id: int
+    food_details: str
+    available_from: datetime
+    available_to: datetime
+    latitude: float
+    longitude: float
+    is_taken: bool = False
+    distance: Optional[float] = None
+
+    @classmethod
+    def from_model(cls, gathering):
+        return cls(
+            id=gathering.id,
+            user_id=gathering.user_id,
+            food_details=gathering.food_details,
+            available_from=_naive(gathering.available_from),
+            available_to=_naive(gathering.available_to),
+            latitude=gathering.latitude,
+            longitude=gathering.longitude,
+            is_taken=bool(gathering.is_taken),
+        )
+
+# GatheringSnapshot's fields, in order
+SNAPSHOT_COLUMNS = [
+    getattr(models.Gathering, name) for name in (
+        "id", "user_id", "food_details", "available_from", "available_to", "latitude", "longitude", "is_taken"
+    )
+]
+
+class LiveIndexMismatch(RuntimeError):
+    pass
+
+def query_open_gathering_ids(db, now):
+    """The SQL definition of "open" that the index has to agree with."""
+    rows = db.query(models.Gathering.id).filter(models.is_available(now)).all()
+    return {row.id for row in rows}
+
+class LiveGatheringIndex:
+    def __init__(self, max_age=None, sync_interval=None, check=False):
+        self.max_age = max_age              # seconds between full reloads, None to never reload
+        self.sync_interval = sync_interval  # seconds between syncs, None to never sync
+        self.check = check                  # compare every read against SQL
+        self.loaded = False
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._gatherings = {}  # untaken, not yet expired (open or pending)
+        self._open = {}        # subset that is inside its availability window
+        self._pending = []     # heap of (available_from, id) not yet open
+        self._expiry = []      # heap of (available_to, id)
+        self._sorted_keys = {}  # sort name -> sorted list of (key, id)
+        self._points = None
+        self._loaded_at = None
+        self._synced_at = None
+        self._last_gathering_id = 0
+        self._last_claim_id = 0
+
+    def load(self, db):
+        now = datetime.now()
+        # Read first, so writes committed during the load are synced again
+        last_gathering_id, last_claim_id = self._last_ids(db)
+        # Plain column rows rather than ORM objects, and heaps built in one
+        # go rather than pushed one by one: this runs before a worker is ready
+        rows = db.query(*SNAPSHOT_COLUMNS).filter(
+            and_(
+                models.Gathering.is_taken == False,
+                models.Gathering.available_to >= now
+            )
+        ).all()
+        # Columns in field order; stored datetimes are already naive
+        snapshots = [GatheringSnapshot(*row) for row in rows]
+        pending = [(s.available_from, s.id) for s in snapshots if s.available_from > now]
+        expiry = [(s.available_to, s.id) for s in snapshots]
+        heapq.heapify(pending)
+        heapq.heapify(expiry)
+        with self._lock:
+            self._reset()
+            self._gatherings = {snapshot.id: snapshot for snapshot in snapshots}
+            self._open = {snapshot.id: snapshot for snapshot in snapshots if snapshot.available_from <= now}
+            self._pending, self._expiry = pending, expiry
+            self._advance(now)
+            self._loaded_at = self._synced_at = time.monotonic()
+            self._last_gathering_id, self._last_claim_id = last_gathering_id, last_claim_id
+            self.loaded = True
+
+    @staticmethod
+    def _last_ids(db):
+        return (
+            db.query(func.coalesce(func.max(models.Gathering.id), 0)).scalar(),
+            db.query(func.coalesce(func.max(models.Claim.id), 0)).scalar(),
+        )
+
+    def sync(self, db):
+        """Pick up the gatherings added, and the ones claimed, since the last load or sync."""
+        with self._lock:
+            last_gathering_id, last_claim_id = self._last_gathering_id, self._last_claim_id
+        claims = db.query(models.Claim.id, models.Claim.gathering_id).filter(models.Claim.id > last_claim_id).all()
+        claimed = {gathering_id for _, gathering_id in claims}
+        # The claimed gatherings are read as they are now, which also covers
+        # a claim that was cancelled again
+        rows = db.query(*SNAPSHOT_COLUMNS).filter(
+            or_(models.Gathering.id > last_gathering_id, models.Gathering.id.in_(claimed))
+        ).all()
+        with self._lock:
+            for gathering_id in claimed:
+                self._remove(gathering_id)
+            for row in rows:
+                snapshot = GatheringSnapshot(*row)
+                self._remove(snapshot.id)
+                if not snapshot.is_taken:
+                    self._add(snapshot)
+            self._last_gathering_id = max([last_gathering_id, *(row.id for row in rows)])
+            self._last_claim_id = max([last_claim_id, *(claim_id for claim_id, _ in claims)])
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self.loaded = False
+
+    # Write path, called by crud after a successful commit
+    def upsert(self, gathering):
+        snapshot = GatheringSnapshot.from_model(gathering)
+        with self._lock:
+            self._remove(snapshot.id)
+            if not snapshot.is_taken:
+                self._add(snapshot)
+
+    def upsert_many(self, gatherings):
+        snapshots = [GatheringSnapshot.from_model(gathering) for gathering in gatherings]
+        with self._lock:
+            for snapshot in snapshots:
+                self._remove(snapshot.id)
+                if not snapshot.is_taken:
+                    self._add(snapshot)
+
+    def discard(self, gathering_id):
+        with self._lock:
+            self._remove(gathering_id)
+
+    def _add(self, snapshot):
+        self._gatherings[snapshot.id] = snapshot
+        heapq.heappush(self._expiry, (snapshot.available_to, snapshot.id))
+        heapq.heappush(self._pending, (snapshot.available_from, snapshot.id))
+        self._changed()
+
+    def _remove(self, gathering_id):
+        # Heap entries are dropped lazily when they no longer match
+        if self._gatherings.pop(gathering_id, None) is not None:
+            self._open.pop(gathering_id, None)
+            self._changed()
+
+    def _changed(self):
+        self._sorted_keys = {}
+        self._points = None
+
+    def _advance(self, now):
+        while self._pending and self._pending[0][0] <= now:
+            available_from, gathering_id = heapq.heappop(self._pending)
+            snapshot = self._gatherings.get(gathering_id)
+            if snapshot is not None and snapshot.available_from == available_from:
+                self._open[gathering_id] = snapshot
+                self._changed()
+        while self._expiry and self._expiry[0][0] < now:
+            available_to, gathering_id = heapq.heappop(self._expiry)
+            snapshot = self._gatherings.get(gathering_id)
+            if snapshot is not None and snapshot.available_to == available_to:
+                self._remove(gathering_id)
+
+    def _due(self, interval, last):
+        return interval is not None and time.monotonic() - last >= interval
+
+    def _refresh(self, db, now):
+        with self._lock:
+            reload = self._due(self.max_age, self._loaded_at)
+            sync = not reload and self._due(self.sync_interval, self._synced_at)
+            # Claimed here, so concurrent reads do not do it as well
+            if reload:
+                self._loaded_at = self._synced_at = time.monotonic()
+            elif sync:
+                self._synced_at = time.monotonic()
+        if reload or sync or self.check:
+            # Against the primary, as the request's session may read from a
+            # lagging replica
+            with SessionLocal() as primary:
+                if reload:
+                    self.load(primary)
+                elif sync:
+                    self.sync(primary)
+                with self._lock:
+                    self._advance(now)
+                if self.check:
+                    self.verify(primary, now)
+        else:
+            with self._lock:
+                self._advance(now)
+
+    # Read path
+    def available(self, db, skip=0, limit=100, after=None, sort="id"):
+        """Open gatherings in (available_to, id) or id order, after the given key."""
+        now = datetime.now()
+        self._refresh(db, now)
+        with self._lock:
+            keys = self._sorted_keys.get(sort)
+            if keys is None:
+                if sort == "available_to":
+                    keys = sorted(((s.available_to, s.id), s.id) for s in self._open.values())
+                else:
+                    keys = sorted(((i,), i) for i in self._open)
+                self._sorted_keys[sort] = keys
+            start = bisect.bisect_right(keys, (tuple(after), float("inf"))) if after is not None else 0
+            start += skip
+            return [self._open[i] for _, i in keys[start:start + limit]]
+
+    def nearby(self, db, latitude, longitude, max_distance_km, limit=None, after=None):
+        now = datetime.now()
+        self._refresh(db, now)
+        with self._lock:
+            if self._points is None:
+                self._points = GatheringPoints.from_rows([
+                    (s.id, s.latitude, s.longitude) for s in self._open.values()
+                ])
+            points, snapshots = self._points, self._open.copy()
+        nearest = points.nearest(latitude, longitude, max_distance_km, k=limit, after=after)
+        return [replace(snapshots[gathering_id], distance=distance)
+                for distance, gathering_id in nearest]
+
+    def open_ids(self):
+        with self._lock:
+            return set(self._open)
+
+    def open_count(self):
+        with self._lock:
+            self._advance(datetime.now())
+            return len(self._open)
+
+    def open_gatherings(self):
+        with self._lock:
+            self._advance(datetime.now())
+            return list(self._open.values())
+
+    def get_open(self, gathering_ids):
+        """{id: snapshot} for those of the given gatherings that are open."""
+        with self._lock:
+            self._advance(datetime.now())
+            return {i: self._open[i] for i in gathering_ids if i in self._open}
+
+    def seconds_until_change(self):
+        """Seconds until the next gathering window opens or closes, if known."""
+        if not self.loaded:
+            return None
+        with self._lock:
+            times = [heap[0][0] for heap in (self._pending, self._expiry) if heap]
+        if not times:
+            return None
+        return (min(times) - datetime.now()).total_seconds()
+
+    def verify(self, db, now=None):
+        """Raise LiveIndexMismatch if the index disagrees with the database."""
+        now = now or datetime.now()
+        with self._lock:
+            self._advance(now)
+            indexed = set(self._open)
+        expected = query_open_gathering_ids(db, now)
+        if indexed != expected:
+            raise LiveIndexMismatch(
+                f"live index out of sync: missing {sorted(expected - indexed)}, "
+                f"unexpected {sorted(indexed - expected)}"
+            )
+
+def _seconds(name, default):
+    # Unset or "0" turns it off
+    value = float(os.environ.get(name, default) or 0)
+    return value if value > 0 else None
+
+index = LiveGatheringIndex(
+    max_age=_seconds("LIVE_INDEX_MAX_AGE", "60"),
+    sync_interval=_seconds("LIVE_INDEX_SYNC_SECONDS", "1"),
+    check=os.environ.get("LIVE_INDEX_CHECK") == "1",
+)
+
+# Cached lists of open gatherings go stale as soon as a window opens or closes
+response_cache.TTL_HINTS["gatherings"] = index.seconds_until_change
@@ -1,31 +1,180 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import models
-from database import engine
-from routers import users, gatherings, claims
-
-# Create DB tables
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Food Donation API")
-
-# CORS middleware setup for frontend access
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Restrict this in production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include routers
-app.include_router(users.router)
-app.include_router(gatherings.router)
-app.include_router(claims.router)
-
-@app.get("/")
-def root():
-    return {"message": "Welcome to the Food Donation API. Visit /docs for API documentation."}
+from fastapi.responses import PlainTextResponse
+import archive, database, events, live_index, matching, metrics, migrations, pagination, rate_limit, replicas, response_cache, stats, tokens, user_cache, warmup
+from rate_limit import RateLimitMiddleware
+from response_cache import ResponseCacheMiddleware
+from database import engine, SessionLocal, AsyncSessionLocal
+from routers import users, gatherings, claims, feed
+from routers import stats as stats_router
+
+# The app is built by create_app() and set up by its lifespan: nothing touches
+# the database at import. `uvicorn main:app` and `uvicorn --factory
+# main:create_app` both work. Startup, before the worker reports ready:
+#
+#   migrate     create and upgrade the schema, unless MIGRATE_ON_STARTUP=0
+#               (then run `python -m migrations` once per deploy instead)
+#   live_index  load the open gatherings
+#   warm-up     warmup.py: connection pools, bcrypt, hot queries
+#
+# then the background jobs start, unless BACKGROUND_JOBS=0. They work on the
+# shared database, so with several workers only one of them should run them.
+# The phases are timed in startup_report.
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_ON_STARTUP = os.environ.get("MIGRATE_ON_STARTUP", "1") == "1"
+BACKGROUND_JOBS = os.environ.get("BACKGROUND_JOBS", "1") == "1"
+
+startup_report = {}  # phase -> seconds
+
+def _timed(phase, step, *args):
+    started = time.perf_counter()
+    step(*args)
+    startup_report[phase] = time.perf_counter() - started
+
+def migrate():
+    migrations.migrate(engine)
+    # Local SQLite replicas start from the migrated primary
+    replicas.sync()
+
+def load_live_index():
+    db = SessionLocal()
+    try:
+        live_index.index.load(db)
+    finally:
+        db.close()
+
+def background_jobs():
+    jobs = {}
+    if matching.MATCH_INTERVAL_SECONDS > 0:
+        jobs["matching"] = matching.run_periodically()
+    if archive.ARCHIVE_INTERVAL_SECONDS > 0:
+        jobs["archive"] = archive.run_periodically()
+    if replicas.REPLICA_SYNC_INTERVAL_SECONDS > 0 and replicas.sqlite_replica_paths():
+        jobs["replica"] = replicas.run_periodically()
+    if stats.STATS_RECONCILE_INTERVAL_SECONDS > 0:
+        jobs["stats"] = stats.run_periodically()
+    return jobs
+
+def start_background_jobs(app):
+    jobs = background_jobs() if BACKGROUND_JOBS else {}
+    app.state.background_tasks = {name: asyncio.create_task(job) for name, job in jobs.items()}
+
+@asynccontextmanager
+async def lifespan(app):
+    started = time.perf_counter()
+    if MIGRATE_ON_STARTUP:
+        _timed("migrate", migrate)
+    _timed("live_index", load_live_index)
+    if warmup.WARMUP:
+        startup_report.update({f"warmup_{step}": seconds for step, seconds in warmup.run().items()})
+    startup_report["total"] = time.perf_counter() - started
+    logger.info("ready in %.2fs: %s", startup_report["total"],
+                ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in startup_report.items()))
+    start_background_jobs(app)
+    try:
+        yield
+    finally:
+        tasks = app.state.background_tasks.values()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def create_app():
+    app = FastAPI(title="Food Donation API", default_response_class=metrics.TimedJSONResponse, lifespan=lifespan)
+
+    # Keeps a client that wrote reading from the primary, inside the response
+    # cache so cached responses never carry its cookie
+    app.add_middleware(database.ReadYourWritesMiddleware)
+
+    # Cached responses for polled read endpoints, inside CORS so they still get
+    # CORS headers
+    app.add_middleware(ResponseCacheMiddleware)
+
+    # Rate limits and load shedding, before the response cache so that polling
+    # from cache still counts, and inside CORS so browsers can read the 429s
+    app.add_middleware(RateLimitMiddleware)
+
+    # CORS middleware setup for frontend access
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Restrict this in production
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        # The next-page cursor of the list endpoints
+        expose_headers=[pagination.NEXT_CURSOR_HEADER],
+    )
+
+    # Outermost, so cached responses and CORS preflights are timed too
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    # Include routers
+    if AsyncSessionLocal is not None:
+        # Async read endpoints take precedence over their sync versions
+        from routers import async_reads
+        app.include_router(async_reads.router)
+    app.include_router(users.router)
+    app.include_router(gatherings.router)
+    app.include_router(claims.router)
+    app.include_router(feed.router)
+    app.include_router(stats_router.router)
+
+    @app.get("/metrics", include_in_schema=False)
+    def read_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/")
+    def root():
+        return {"message": "Welcome to the Food Donation API. Visit /docs for API documentation."}
+
+    return app
+
+def _cache_stat(stat):
+    caches = {"user": user_cache.stats, "response": response_cache.stats, "token": tokens.stats}
+    return lambda: {(name,): stats()[stat] for name, stats in caches.items()}
+
+metrics.CallbackMetric("cache_entries", "Entries in each in-memory cache.", "gauge", ("cache",), _cache_stat("size"))
+metrics.CallbackMetric("cache_hits_total", "Cache hits.", "counter", ("cache",), _cache_stat("hits"))
+metrics.CallbackMetric("cache_misses_total", "Cache misses.", "counter", ("cache",), _cache_stat("misses"))
+metrics.CallbackMetric("cache_evictions_total", "Cache LRU evictions.", "counter", ("cache",), _cache_stat("evictions"))
+metrics.CallbackMetric("live_index_open_gatherings", "Open gatherings in the live index.", "gauge", (),
+                       lambda: {(): len(live_index.index.open_ids())})
+metrics.CallbackMetric("feed_subscribers", "Open real-time feed connections.", "gauge", (),
+                       lambda: {(): events.broker.subscriber_count})
+metrics.CallbackMetric("revoked_tokens", "Revoked tokens not yet expired (in-process revocation list).", "gauge", (),
+                       lambda: {(): len(tokens.revocations)} if hasattr(tokens.revocations, "__len__") else {})
+metrics.CallbackMetric("rejected_requests_total", "Requests turned away by rate limits or load shedding.",
+                       "counter", ("reason",), lambda: {(reason,): n for reason, n in rate_limit.rejected.items()})
+metrics.CallbackMetric("admission_active_requests", "Requests holding a concurrency slot.", "gauge", (),
+                       lambda: {(): rate_limit.limiter.active})
+metrics.CallbackMetric("admission_queued_requests", "Requests waiting for a concurrency slot.", "gauge", (),
+                       lambda: {(): rate_limit.limiter.queued})
+metrics.CallbackMetric("archived_rows_total", "Rows moved to the archive tables.", "counter", ("table",),
+                       lambda: {(table,): archive.totals[table] for table in ("gatherings", "claims")})
+metrics.CallbackMetric("archive_batches_total", "Archive batches committed.", "counter", (),
+                       lambda: {(): archive.totals["batches"]})
+metrics.CallbackMetric("archive_last_run_seconds", "Duration of the last archive run.", "gauge", (),
+                       lambda: {(): archive.last_report.seconds} if archive.last_report else {})
+metrics.CallbackMetric("stats_reconcile_corrections_total", "Donors whose stats counters reconciliation corrected.",
+                       "counter", (), lambda: {(): stats.totals["corrected"]})
+metrics.CallbackMetric("stats_reconcile_last_run_seconds", "Duration of the last stats reconciliation.", "gauge", (),
+                       lambda: {(): stats.last_report.seconds} if stats.last_report else {})
+metrics.CallbackMetric("db_sessions_total", "Request database sessions by the database they read from.",
+                       "counter", ("target",), lambda: {(target,): n for target, n in database.routed.items()})
+metrics.CallbackMetric("replica_lag_seconds", "Time since the SQLite replicas were last synced.", "gauge", (),
+                       lambda: {(): replicas.lag_seconds()} if replicas.last_synced_at is not None else {})
+metrics.CallbackMetric("startup_phase_seconds", "Duration of each startup phase of this worker.", "gauge", ("phase",),
+                       lambda: {(phase,): seconds for phase, seconds in startup_report.items()})
+
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+import geo, live_index, models, response_cache, schemas
+from database import SessionLocal
+from distance import GatheringPoints, MAX_MATRIX_CELLS
+
+# Batch donor-recipient matching. Every recipient with a location is scored
+# against the open gatherings within MATCH_RADIUS_KM, by distance and by how
+# soon the gathering's window closes, and keeps its best MATCH_SUGGESTIONS.
+#
+# Recipients are bucketed by geohash cell and each bucket is only compared
+# with the gatherings in the cells its radius can reach, as one distance
+# matrix. Buckets are independent, so with MATCH_WORKERS > 1 they are scored
+# in a process pool. The latest run is kept in memory and served by
+# GET /gatherings/suggestions; MATCH_INTERVAL_SECONDS sets how often it is
+# recomputed in the background (0 disables the background job).
+
+logger = logging.getLogger(__name__)
+
+MATCH_RADIUS_KM = float(os.environ.get("MATCH_RADIUS_KM", "10"))
+MATCH_SUGGESTIONS = int(os.environ.get("MATCH_SUGGESTIONS", "10"))
+MATCH_WORKERS = int(os.environ.get("MATCH_WORKERS", "1"))
+MATCH_INTERVAL_SECONDS = float(os.environ.get("MATCH_INTERVAL_SECONDS", "300"))
+
+MATCH_CELL_PRECISION = 5       # ~4.9km x 4.9km recipient buckets
+URGENCY_HORIZON_HOURS = 24.0   # windows closing later than this are not urgent
+URGENCY_WEIGHT = 0.4           # share of the score given to urgency, the rest is distance
+
+class Suggestion(NamedTuple):
+    gathering_id: int
+    distance: float
+    score: float
+
+@dataclass
+class MatchResult:
+    computed_at: datetime
+    recipients: int
+    gatherings: int
+    seconds: float
+    suggestions: Dict[int, List[Suggestion]] = field(default_factory=dict)
+
+latest: Optional[MatchResult] = None
+_run_lock = threading.Lock()
+
+def score_bucket(task):
+    """
+    Rank the candidate gatherings for one bucket of recipients. Runs in a
+    worker process, so it takes and returns plain arrays: the recipient ids
+    and, per recipient, the top-k gathering ids, distances and scores, best
+    first. Slots with no gathering in range have a score of -inf.
+    """
+    (recipient_ids, recipient_lats, recipient_lons,
+     gathering_ids, gathering_lats, gathering_lons, hours_left,
+     radius_km, k) = task
+    points = GatheringPoints(gathering_ids, gathering_lats, gathering_lons)
+    urgency = 1.0 - np.clip(hours_left / URGENCY_HORIZON_HOURS, 0.0, 1.0)
+    k = min(k, len(points))
+    ids, distances, scores = [], [], []
+    chunk = max(1, MAX_MATRIX_CELLS // len(points))
+    for start in range(0, len(recipient_ids), chunk):
+        d = points.distance_matrix(recipient_lats[start:start + chunk],
+                                   recipient_lons[start:start + chunk])
+        score = (1.0 - URGENCY_WEIGHT) * (1.0 - d / radius_km) + URGENCY_WEIGHT * urgency
+        score[d > radius_km] = -np.inf
+        top = np.argpartition(-score, k - 1, axis=1)[:, :k]
+        top_score = np.take_along_axis(score, top, axis=1)
+        top_d = np.take_along_axis(d, top, axis=1)
+        top_ids = points.ids[top]
+        # Best score first, then nearest, then lowest id
+        order = np.lexsort((top_ids, top_d, -top_score), axis=1)
+        ids.append(np.take_along_axis(top_ids, order, axis=1))
+        distances.append(np.take_along_axis(top_d, order, axis=1))
+        scores.append(np.take_along_axis(top_score, order, axis=1))
+    return recipient_ids, np.vstack(ids), np.vstack(distances), np.vstack(scores)
+
+def _open_gatherings(db, now):
+    if live_index.index.loaded:
+        return [(s.id, s.latitude, s.longitude, s.available_to)
+                for s in live_index.index.open_gatherings()]
+    return db.query(
+        models.Gathering.id, models.Gathering.latitude,
+        models.Gathering.longitude, models.Gathering.available_to
+    ).filter(models.is_available(now)).all()
+
+def _recipients(db):
+    return db.query(models.User.id, models.User.latitude, models.User.longitude).filter(
+        models.User.user_type == "recipient",
+        models.User.latitude.isnot(None),
+        models.User.longitude.isnot(None)
+    ).all()
+
+def _grid(latitudes, longitudes):
+    # Row and column of the geohash cell (at MATCH_CELL_PRECISION) of each
+    # point, computed directly rather than by encoding every point
+    lat_step, lon_step = geo.cell_size(MATCH_CELL_PRECISION)
+    rows = np.floor((latitudes + 90.0) / lat_step).astype(np.int64)
+    cols = np.floor((longitudes + 180.0) / lon_step).astype(np.int64)
+    rows = np.minimum(rows, round(180.0 / lat_step) - 1)
+    cols = np.minimum(cols, round(360.0 / lon_step) - 1)
+    return rows, cols
+
+def _region(row, col, radius_km):
+    # Grid rows and columns reachable from anywhere inside cell (row, col)
+    lat_step, lon_step = geo.cell_size(MATCH_CELL_PRECISION)
+    min_lat, min_lon = -90.0 + row * lat_step, -180.0 + col * lon_step
+    boxes = [geo.bounding_box(lat, lon, radius_km)
+             for lat in (min_lat, min_lat + lat_step) for lon in (min_lon, min_lon + lon_step)]
+    rows, cols = _grid(
+        np.array([min(box[0] for box in boxes), max(box[1] for box in boxes)]),
+        np.array([min(box[2] for box in boxes), max(box[3] for box in boxes)])
+    )
+    return range(rows[0], rows[1] + 1), cols[0], cols[1]
+
+def build_tasks(recipients, gatherings, now, radius_km=MATCH_RADIUS_KM, k=MATCH_SUGGESTIONS):
+    """
+    Split the problem into one score_bucket task per recipient cell.
+    recipients are (id, latitude, longitude) rows, gatherings are
+    (id, latitude, longitude, available_to) rows.
+    """
+    if not recipients or not gatherings:
+        return []
+    r_ids, r_lats, r_lons = (np.array(column) for column in zip(*recipients))
+    g_ids, g_lats, g_lons, g_to = zip(*gatherings)
+    g_ids, g_lats, g_lons = np.array(g_ids), np.array(g_lats), np.array(g_lons)
+    g_hours = np.array([(to - now).total_seconds() / 3600 for to in g_to])
+
+    # Sort gatherings by cell so each grid row of a region is one slice
+    _, lon_step = geo.cell_size(MATCH_CELL_PRECISION)
+    width = round(360.0 / lon_step)
+    g_rows, g_cols = _grid(g_lats, g_lons)
+    g_keys = g_rows * width + g_cols
+    by_cell = np.argsort(g_keys, kind="stable")
+    g_keys = g_keys[by_cell]
+
+    r_rows, r_cols = _grid(r_lats, r_lons)
+    r_keys = r_rows * width + r_cols
+    by_bucket = np.argsort(r_keys, kind="stable")
+    bucket_keys, bucket_starts = np.unique(r_keys[by_bucket], return_index=True)
+    bucket_ends = np.append(bucket_starts[1:], len(by_bucket))
+
+    tasks = []
+    for key, start, end in zip(bucket_keys.tolist(), bucket_starts.tolist(), bucket_ends.tolist()):
+        rows, first_col, last_col = _region(key // width, key % width, radius_km)
+        slices = [
+            by_cell[np.searchsorted(g_keys, row * width + first_col):
+                    np.searchsorted(g_keys, row * width + last_col, side="right")]
+            for row in rows
+        ]
+        candidates = np.concatenate(slices)
+        if not len(candidates):
+            continue
+        members = by_bucket[start:end]
+        tasks.append((
+            r_ids[members], r_lats[members], r_lons[members],
+            g_ids[candidates], g_lats[candidates], g_lons[candidates], g_hours[candidates],
+            radius_km, k,
+        ))
+    return tasks
+
+def match(recipients, gatherings, now=None, radius_km=MATCH_RADIUS_KM,
+          k=MATCH_SUGGESTIONS, workers=MATCH_WORKERS):
+    """Score recipients against gatherings and return {recipient_id: [Suggestion]}."""
+    now = now or datetime.now()
+    tasks = build_tasks(recipients, gatherings, now, radius_km, k)
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            batches = list(pool.map(score_bucket, tasks, chunksize=chunksize))
+    else:
+        batches = [score_bucket(task) for task in tasks]
+    suggestions = {}
+    for recipient_ids, ids, distances, scores in batches:
+        found = np.isfinite(scores)
+        for recipient_id, row_ids, row_d, row_scores, row_found in zip(
+                recipient_ids.tolist(), ids.tolist(), distances.tolist(),
+                scores.tolist(), found.tolist()):
+            if row_found[0]:
+                suggestions[recipient_id] = [
+                    Suggestion(*values)
+                    for values in zip(row_ids, row_d, row_scores) if values[2] != -np.inf
+                ]
+    return suggestions
+
+def run(db, workers=MATCH_WORKERS):
+    """Recompute suggestions for every recipient and publish them as latest."""
+    global latest
+    with _run_lock:
+        started = time.perf_counter()
+        now = datetime.now()
+        recipients = _recipients(db)
+        gatherings = _open_gatherings(db, now)
+        suggestions = match(recipients, gatherings, now, workers=workers)
+        latest = MatchResult(
+            computed_at=now,
+            recipients=len(recipients),
+            gatherings=len(gatherings),
+            seconds=time.perf_counter() - started,
+            suggestions=suggestions,
+        )
+        response_cache.invalidate("suggestions")
+        return latest
+
+def run_with_session():
+    db = SessionLocal()
+    try:
+        return run(db)
+    finally:
+        db.close()
+
+async def run_periodically(interval=MATCH_INTERVAL_SECONDS):
+    while True:
+        try:
+            result = await asyncio.to_thread(run_with_session)
+            logger.info("matched %d recipients against %d gatherings in %.2fs",
+                        result.recipients, result.gatherings, result.seconds)
+        except Exception:
+            logger.exception("matching run failed")
+        await asyncio.sleep(interval)
+
+def suggestions_for(db, recipient_id, limit=None):
+    """
+    The latest suggestions for a recipient, best first, leaving out any
+    gathering that has been claimed or has closed since the run.
+    """
+    result = latest
+    ranked = result.suggestions.get(recipient_id, []) if result is not None else []
+    if not ranked:
+        return []
+    ids = [suggestion.gathering_id for suggestion in ranked]
+    if live_index.index.loaded:
+        gatherings = live_index.index.get_open(ids)
+    else:
+        now = datetime.now()
+        gatherings = {g.id: g for g in db.query(models.Gathering).filter(
+            models.Gathering.id.in_(ids), models.is_available(now)
+        )}
+    ranked = [s for s in ranked if s.gathering_id in gatherings][:limit]
+    return [
+        schemas.SuggestionResponse(
+            **schemas.GatheringResponse.from_orm(gatherings[s.gathering_id]).dict(),
+            distance=s.distance,
+            score=s.score,
+        )
+        for s in ranked
+    ]
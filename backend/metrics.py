@@ -0,0 +1,207 @@
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import List, Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request-level instrumentation, exposed in the Prometheus text format on
+# GET /metrics. MetricsMiddleware times every request by route template and
+# counts the SQL it ran (through cursor events on every engine); passwords and
+# routers.users time bcrypt and JWT work; the response classes time JSON
+# rendering. Response model validation is not timed on its own: it is part of
+# the request latency, and benchmarks/serialization_bench.py measures it.
+#
+# Set SLOW_REQUEST_SECONDS to log every request slower than that, with the
+# statements it executed and their timings.
+
+logger = logging.getLogger(__name__)
+
+_slow = os.environ.get("SLOW_REQUEST_SECONDS")
+SLOW_REQUEST_SECONDS = float(_slow) if _slow else None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REGISTRY = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *labelvalues):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labelvalues, list(values)) for labelvalues, values in self._series.items())
+        for labelvalues, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {values[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}")
+        return lines
+
+class CallbackMetric:
+    """
+    A counter or gauge kept elsewhere and read at scrape time: callback
+    returns {label values: value}.
+    """
+
+    def __init__(self, name, documentation, kind, labelnames, callback):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = labelnames
+        self.callback = callback
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labelvalues, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route template.",
+    ("method", "route", "status"))
+REQUEST_QUERIES = Histogram(
+    "http_request_sql_queries", "SQL statements executed per request.",
+    ("method", "route"), buckets=QUERY_COUNT_BUCKETS)
+REQUEST_QUERY_SECONDS = Histogram(
+    "http_request_sql_seconds", "Time spent executing SQL per request.",
+    ("method", "route"))
+SQL_SECONDS = Histogram("sql_query_duration_seconds", "Duration of each SQL statement.")
+BCRYPT_SECONDS = Histogram(
+    "bcrypt_duration_seconds", "Time spent hashing or verifying a password.",
+    ("operation",), buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0))
+JWT_SECONDS = Histogram(
+    "jwt_duration_seconds", "Time spent encoding or decoding an access token.",
+    ("operation",), buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005))
+SERIALIZE_SECONDS = Histogram(
+    "response_serialize_duration_seconds",
+    "JSON rendering time, by serialization path: response model or fast (orjson).",
+    ("path",))
+
+# Per-request counters, visible to the SQL events through the context, which
+# starlette copies into the threadpool that runs sync endpoints
+@dataclass
+class RequestStats:
+    queries: int = 0
+    query_seconds: float = 0.0
+    statements: Optional[List[tuple]] = None  # (seconds, statement), slow log only
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+    SQL_SECONDS.observe(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+        if stats.statements is not None:
+            stats.statements.append((elapsed, statement))
+
+def _route_label(scope):
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "admission" in scope:
+        return scope["admission"]  # turned away by rate_limit.py
+    if "response_cache" in scope:
+        return "response_cache"
+    return "unmatched"
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL use for every request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats(statements=[] if SLOW_REQUEST_SECONDS is not None else None)
+        token = _current.set(stats)
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            method, route = scope["method"], _route_label(scope)
+            REQUEST_SECONDS.observe(elapsed, method, route, str(status))
+            REQUEST_QUERIES.observe(stats.queries, method, route)
+            REQUEST_QUERY_SECONDS.observe(stats.query_seconds, method, route)
+            if SLOW_REQUEST_SECONDS is not None and elapsed >= SLOW_REQUEST_SECONDS:
+                logger.warning(
+                    "slow request: %s %s took %.3fs, %d queries in %.3fs\n%s",
+                    method, scope["path"], elapsed, stats.queries, stats.query_seconds,
+                    "\n".join(f"  {seconds * 1000:.2f}ms  {statement}"
+                              for seconds, statement in stats.statements)
+                )
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content):
+        with SERIALIZE_SECONDS.time("model"):
+            return super().render(content)
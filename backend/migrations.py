@@ -0,0 +1,99 @@
+from sqlalchemy import inspect, text
+
+import geo, models
+
+# Schema upgrades for database files created before a column or index was
+# added to models.py. create_all() only creates missing tables, so anything
+# added to an existing table has to be applied here. Every step is idempotent.
+#
+# Run `python -m migrations` once per deploy, before starting the workers
+# with MIGRATE_ON_STARTUP=0, so that they do not each inspect the schema
+# while booting. MIGRATE_ON_STARTUP defaults to on, for development.
+
+def _add_gathering_geohash(conn):
+    columns = {c["name"] for c in inspect(conn).get_columns("gatherings")}
+    if "geohash" not in columns:
+        conn.execute(text("ALTER TABLE gatherings ADD COLUMN geohash VARCHAR"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_gatherings_geohash ON gatherings (geohash)"))
+
+    # Backfill rows written before the column existed
+    rows = conn.execute(text(
+        "SELECT id, latitude, longitude FROM gatherings WHERE geohash IS NULL"
+    )).fetchall()
+    if rows:
+        conn.execute(
+            text("UPDATE gatherings SET geohash = :geohash WHERE id = :id"),
+            [{"id": row.id, "geohash": geo.encode(row.latitude, row.longitude)} for row in rows]
+        )
+
+# Full-text index over gatherings.food_details for crud.search_gatherings. An
+# external content FTS5 table: it stores only the index and reads the text
+# from gatherings, and triggers keep it in step with every insert, delete
+# (including archiving) and food_details update, however the row is written.
+GATHERINGS_FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS gatherings_fts_insert AFTER INSERT ON gatherings BEGIN
+        INSERT INTO gatherings_fts (rowid, food_details) VALUES (new.id, new.food_details);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS gatherings_fts_delete AFTER DELETE ON gatherings BEGIN
+        INSERT INTO gatherings_fts (gatherings_fts, rowid, food_details)
+        VALUES ('delete', old.id, old.food_details);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS gatherings_fts_update AFTER UPDATE OF food_details ON gatherings BEGIN
+        INSERT INTO gatherings_fts (gatherings_fts, rowid, food_details)
+        VALUES ('delete', old.id, old.food_details);
+        INSERT INTO gatherings_fts (rowid, food_details) VALUES (new.id, new.food_details);
+    END""",
+]
+
+def _create_gathering_search_index(conn):
+    if conn.dialect.name != "sqlite":
+        return  # crud.search_gatherings falls back to LIKE
+    if inspect(conn).has_table("gatherings_fts"):
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE gatherings_fts USING fts5("
+        "food_details, content='gatherings', content_rowid='id', "
+        "tokenize='porter unicode61 remove_diacritics 2')"
+    ))
+    for trigger in GATHERINGS_FTS_TRIGGERS:
+        conn.execute(text(trigger))
+    # Index the rows written before the table existed
+    conn.execute(text("INSERT INTO gatherings_fts (gatherings_fts) VALUES ('rebuild')"))
+
+def _create_missing_indexes(conn):
+    # Indexes declared in models.py that an older database file lacks
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+    if conn.dialect.name == "sqlite":
+        # Refresh query planner statistics for the new indexes
+        conn.execute(text("PRAGMA optimize"))
+
+MIGRATIONS = [
+    _add_gathering_geohash,
+    _create_missing_indexes,
+    _create_gathering_search_index,
+]
+
+def run_migrations(engine):
+    with engine.begin() as conn:
+        for migration in MIGRATIONS:
+            migration(conn)
+
+def migrate(engine):
+    """Create missing tables, then apply the upgrades."""
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+if __name__ == "__main__":
+    import time
+
+    import replicas
+    from database import engine
+
+    started = time.perf_counter()
+    migrate(engine)
+    # Local SQLite replicas start from the migrated primary
+    synced = replicas.sync()
+    print(f"migrated {engine.url!r} in {time.perf_counter() - started:.2f}s"
+          + (f", synced {synced} replica(s)" if synced else ""))
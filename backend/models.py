@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy import and_, event, inspect
 from sqlalchemy.orm import relationship
 
 from database import Base
+import geo, response_cache, user_cache
 
 class User(Base):
     __tablename__ = "users"
@@ -20,29 +22,108 @@ class User(Base):
 
 class Gathering(Base):
     __tablename__ = "gatherings"
+    __table_args__ = (
+        # Availability filter: is_taken == False AND available_to >= now
+        Index("ix_gatherings_is_taken_available_to", "is_taken", "available_to"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     food_details = Column(String, nullable=False)
     available_from = Column(DateTime, nullable=False)
     available_to = Column(DateTime, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    geohash = Column(String, index=True)  # kept in sync with latitude/longitude
     is_taken = Column(Boolean, default=False)
 
     # Relationships
     user = relationship("User", back_populates="gatherings")
     claims = relationship("Claim", back_populates="gathering")
 
+def is_available(now):
+    """Filter for gatherings that can be claimed at now: the SQL definition of "open"."""
+    return and_(
+        Gathering.is_taken == False,
+        Gathering.available_from <= now,
+        Gathering.available_to >= now
+    )
+
 class Claim(Base):
     __tablename__ = "claims"
+    __table_args__ = (
+        # Claims for a gathering, and "did this recipient claim it"
+        Index("ix_claims_gathering_id_recipient_id", "gathering_id", "recipient_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    recipient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    recipient_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     gathering_id = Column(Integer, ForeignKey("gatherings.id"), nullable=False)
     claim_time = Column(DateTime, nullable=False)
     status = Column(String, nullable=False)  # "claimed", "collected", "cancelled"
 
     # Relationships
     recipient = relationship("User", back_populates="claims", foreign_keys=[recipient_id])
-    gathering = relationship("Gathering", back_populates="claims")
\ No newline at end of file
+    gathering = relationship("Gathering", back_populates="claims")
+
+# Archive tables. archive.py moves long-finished gatherings and their claims
+# here in batches, so the hot tables only hold rows that can still change.
+class ArchivedGathering(Base):
+    __tablename__ = "gatherings_archive"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    food_details = Column(String, nullable=False)
+    available_from = Column(DateTime, nullable=False)
+    available_to = Column(DateTime, nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    geohash = Column(String)
+    is_taken = Column(Boolean)
+    archived_at = Column(DateTime, nullable=False)
+
+class ArchivedClaim(Base):
+    __tablename__ = "claims_archive"
+
+    id = Column(Integer, primary_key=True)
+    recipient_id = Column(Integer, nullable=False, index=True)
+    gathering_id = Column(Integer, nullable=False, index=True)
+    claim_time = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+
+# Running donation and claim counters, one row per donor and one for all
+# donors (donor_id 0). crud updates them in the same transaction as each
+# write; stats.py reconciles them with the base and archive tables.
+class DonationStats(Base):
+    __tablename__ = "donation_stats"
+    __table_args__ = (
+        # Top donors
+        Index("ix_donation_stats_gatherings_posted", "gatherings_posted"),
+    )
+
+    donor_id = Column(Integer, primary_key=True, autoincrement=False)
+    gatherings_posted = Column(Integer, nullable=False, default=0)
+    claims = Column(Integer, nullable=False, default=0)
+    claims_claimed = Column(Integer, nullable=False, default=0)    # claims by current status
+    claims_collected = Column(Integer, nullable=False, default=0)
+    claims_cancelled = Column(Integer, nullable=False, default=0)
+
+# Keep Gathering.geohash current whenever a gathering is written
+@event.listens_for(Gathering, "before_insert")
+@event.listens_for(Gathering, "before_update")
+def _set_gathering_geohash(mapper, connection, target):
+    if target.latitude is not None and target.longitude is not None:
+        target.geohash = geo.encode(target.latitude, target.longitude)
+
+
+# Drop cached authenticated users and responses whenever a user row changes
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    history = inspect(target).attrs.email.history
+    for email in {target.email, *history.deleted}:
+        if email is not None:
+            user_cache.invalidate(email)
+    response_cache.invalidate("users")
@@ -0,0 +1,95 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+import serialization
+from database import stream_session
+
+# Keyset (cursor) pagination shared by the list endpoints. A cursor is the
+# sort key of the last item on the previous page, encoded as an opaque string;
+# the next page is "everything after that key", which stays an index range
+# scan no matter how deep the client pages, unlike OFFSET.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000  # largest limit a list endpoint accepts
+
+def _field(item, name):
+    # Items are ORM objects, or dicts on the fast serialization path
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+# Sort orders: name -> function giving an item's key
+SORT_KEYS = {
+    "id": lambda item: (_field(item, "id"),),
+    "available_to": lambda item: (_field(item, "available_to"), _field(item, "id")),
+}
+
+LIST_FORMATS = ("json", "ndjson")
+
+def check_list_params(sort="id", format="json"):
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SORT_KEYS)}")
+    if format not in LIST_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(LIST_FORMATS)}")
+
+def encode_cursor(key) -> str:
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, sort="id"):
+    if cursor is None:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == "available_to":
+            return datetime.fromisoformat(values[0]), int(values[1])
+        return (int(values[0]),)
+    except (ValueError, TypeError, IndexError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate(response, items, limit, sort="id"):
+    """
+    Trim a page fetched with limit + 1 rows to limit rows, and set the
+    next-page cursor header when there are more.
+    """
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        if items:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(SORT_KEYS[sort](items[-1]))
+    return items
+
+def ndjson_response(fetch_page, schema, request_db, sort="id", after=None, page_size=STREAM_PAGE_SIZE):
+    """
+    Stream every item as newline-delimited JSON, one keyset page at a time,
+    so memory stays flat however many rows there are.
+
+    fetch_page(db, after, limit) returns the page after the given key, as
+    ORM objects or as fast-path row dicts. The stream uses its own session,
+    as it outlives the request's dependencies, routed like the request's
+    session request_db: on a replica, unless the client wrote recently.
+    """
+    key = SORT_KEYS[sort]
+
+    def generate():
+        db = stream_session(request_db)
+        last = after
+        try:
+            while True:
+                items = fetch_page(db, last, page_size)
+                for item in items:
+                    if isinstance(item, dict):
+                        yield serialization.dumps(item) + b"\n"
+                    else:
+                        yield schema.from_orm(item).json() + "\n"
+                if len(items) < page_size:
+                    break
+                last = key(items[-1])
+                db.expunge_all()
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
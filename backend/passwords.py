@@ -0,0 +1,64 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+# bcrypt is deliberately slow, so hashing and verification run on a small
+# dedicated thread pool. Async endpoints await it without blocking the event
+# loop, and the pool size caps how many CPU-bound bcrypt calls run at once.
+# bcrypt releases the GIL, so threads give real parallelism here.
+
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get(
+    "PASSWORD_HASH_CONCURRENCY", str(min(4, os.cpu_count() or 1))
+))
+
+_context = None
+_context_lock = threading.Lock()
+
+def context():
+    """
+    The bcrypt CryptContext, built on first use rather than at import, so
+    workers that never hash a password never load passlib or the bcrypt
+    backend. warm_up() builds it ahead of the first login.
+    """
+    global _context
+    if _context is None:
+        with _context_lock:
+            if _context is None:
+                from passlib.context import CryptContext
+
+                crypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+                crypt_context.handler("bcrypt").get_backend()  # loads and self-tests the backend
+                _context = crypt_context
+    return _context
+
+def warm_up():
+    context()
+
+_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_CONCURRENCY, thread_name_prefix="password-hash"
+)
+
+def _hash(password):
+    with metrics.BCRYPT_SECONDS.time("hash"):
+        return context().hash(password)
+
+def _verify(password, hashed_password):
+    with metrics.BCRYPT_SECONDS.time("verify"):
+        return context().verify(password, hashed_password)
+
+def hash_password(password: str) -> str:
+    return _executor.submit(_hash, password).result()
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return _executor.submit(_verify, password, hashed_password).result()
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _hash, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _verify, password, hashed_password)
@@ -0,0 +1,215 @@
+import asyncio
+import importlib
+import inspect
+import json
+import math
+import os
+import re
+import threading
+import time
+
+from fastapi import HTTPException
+
+from routers.users import decode_access_token
+
+# Rate limiting and admission control, in front of the routes.
+#
+# Every request takes a token from a token bucket keyed by client and budget.
+# The client is the token subject for requests with a valid bearer token,
+# otherwise the client IP. The budget is the first of RATE_LIMITS matching the
+# request: a sustained rate per second and a burst size. Login and
+# registration are limited per IP whatever the token, as bcrypt makes them
+# the most expensive requests. A request without a token left gets a 429 with
+# Retry-After.
+#
+# Admitted requests then go through a global concurrency limit: at most
+# MAX_CONCURRENT_REQUESTS run at once, up to MAX_QUEUED_REQUESTS more wait up
+# to ADMISSION_TIMEOUT_SECONDS for a slot, and the rest get a 503 straight
+# away, rather than queueing for the threadpool and the database until every
+# request times out. The real-time feed (STREAMING_PREFIXES) is rate limited
+# but not admitted: its streams stay open for as long as the client listens,
+# and would each hold a slot.
+#
+# Buckets are kept in this process by default. To share them between
+# workers, set RATE_LIMIT_BACKEND to "module:Class". The class needs
+# take(key, rate, burst), returning 0 when a token was taken or else the
+# seconds until one is available (it may be a coroutine), e.g. a Redis script.
+# RATE_LIMIT=0 turns both limits off.
+
+RATE_LIMIT = os.environ.get("RATE_LIMIT", "1") == "1"
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", "64"))
+MAX_QUEUED_REQUESTS = int(os.environ.get("MAX_QUEUED_REQUESTS", "128"))
+ADMISSION_TIMEOUT_SECONDS = float(os.environ.get("ADMISSION_TIMEOUT_SECONDS", "2"))
+# Behind a proxy, take the client IP from the first X-Forwarded-For address
+RATE_LIMIT_FORWARDED_FOR = os.environ.get("RATE_LIMIT_FORWARDED_FOR", "0") == "1"
+
+# (name, methods, path pattern, rate per second, burst, per_ip), first match
+# wins; methods None matches any
+RATE_LIMITS = [
+    ("login", ("POST",), re.compile(r"^/users/token$"), 5 / 60, 10, True),
+    ("register", ("POST",), re.compile(r"^/users/register$"), 10 / 3600, 10, True),
+    ("refresh", ("POST",), re.compile(r"^/users/token/refresh$"), 1 / 60, 10, True),
+    ("nearby", ("GET",), re.compile(r"^/gatherings/nearby$"), 2, 10, False),
+    ("write", ("POST", "PUT"), re.compile(r"^/(?:gatherings|claims)/"), 5, 20, False),
+    ("default", None, re.compile(r""), 20, 60, False),
+]
+
+# Not limited: monitoring has to keep working under overload
+EXEMPT_PATHS = {"/metrics"}
+# Long-lived streams, which skip the concurrency limit (the WebSocket feed is
+# not HTTP and skips both)
+STREAMING_PREFIXES = ("/feed/",)
+
+class InMemoryBuckets:
+    """Token buckets of this process."""
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            if now >= self._next_purge:
+                self._purge(now)
+            return wait
+
+    def _purge(self, now):
+        # Drop buckets that have been idle long enough to refill entirely,
+        # which is the same as not having one
+        self._buckets = {
+            key: (tokens, updated_at) for key, (tokens, updated_at) in self._buckets.items()
+            if now - updated_at < 3600
+        }
+        self._next_purge = now + 60
+
+    def __len__(self):
+        return len(self._buckets)
+
+def _load_backend():
+    spec = os.environ.get("RATE_LIMIT_BACKEND")
+    if not spec:
+        return InMemoryBuckets()
+    module_name, class_name = spec.split(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+class ConcurrencyLimiter:
+    """At most limit holders at once, and at most max_queued waiting."""
+
+    def __init__(self, limit, max_queued, timeout):
+        self.limit = limit
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.active = 0
+        self.queued = 0
+        self._slots = None
+
+    async def acquire(self):
+        """Take a slot; False if none came free in time or the queue is full."""
+        if self._slots is None:
+            # Created on first use, inside the server's event loop
+            self._slots = asyncio.Semaphore(self.limit)
+        if self._slots.locked():
+            if self.queued >= self.max_queued:
+                return False
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._slots.release()
+
+backend = _load_backend()
+limiter = ConcurrencyLimiter(MAX_CONCURRENT_REQUESTS, MAX_QUEUED_REQUESTS, ADMISSION_TIMEOUT_SECONDS)
+
+# Rejections since startup, for /metrics
+rejected = {"rate_limited": 0, "overloaded": 0}
+
+def _budget(method, path):
+    for name, methods, pattern, rate, burst, per_ip in RATE_LIMITS:
+        if (methods is None or method in methods) and pattern.match(path):
+            return name, rate, burst, per_ip
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def _client_ip(scope):
+    if RATE_LIMIT_FORWARDED_FOR:
+        forwarded = _header(scope, b"x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _client_key(scope, per_ip):
+    if not per_ip:
+        scheme, _, token = (_header(scope, b"authorization") or "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            try:
+                # Cached after the first request with the token (tokens.py)
+                return "user:" + decode_access_token(token)["sub"]
+            except HTTPException:
+                pass  # invalid tokens count against the IP
+    return "ip:" + _client_ip(scope)
+
+async def _reject(scope, send, status, detail, retry_after):
+    scope["admission"] = "rate_limited" if status == 429 else "overloaded"
+    rejected[scope["admission"]] += 1
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class RateLimitMiddleware:
+    """ASGI middleware applying RATE_LIMITS and the global concurrency limit."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not RATE_LIMIT or scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        name, rate, burst, per_ip = _budget(scope["method"], scope["path"])
+        wait = backend.take(f"{name}:{_client_key(scope, per_ip)}", rate, burst)
+        if inspect.isawaitable(wait):
+            wait = await wait
+        if wait > 0:
+            return await _reject(scope, send, 429, "Too many requests", wait)
+        if scope["path"].startswith(STREAMING_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        if not await limiter.acquire():
+            return await _reject(scope, send, 503, "Server busy", 1)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
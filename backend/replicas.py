@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+
+from sqlalchemy.engine import make_url
+
+from database import ASYNC_DATABASE_REPLICA_URLS, DATABASE_REPLICA_URLS, SQLALCHEMY_DATABASE_URL
+
+# SQLite read replicas for running and testing read/write splitting locally.
+#
+# Point DATABASE_REPLICA_URLS (and ASYNC_DATABASE_REPLICA_URLS) at SQLite
+# files other than the primary, e.g. sqlite:///./replica1.db, and sync()
+# copies the primary into each of them with SQLite's online backup API. The
+# app syncs them at startup and then every REPLICA_SYNC_INTERVAL_SECONDS,
+# so reads from them lag the primary by up to that long, like a real replica.
+# Each sync copies the whole database, so this is for development-sized
+# databases. With non-SQLite replicas, e.g. Postgres streaming replicas,
+# there is nothing to sync and this module does nothing.
+#
+# Run `python replicas.py` to sync once.
+
+logger = logging.getLogger(__name__)
+
+REPLICA_SYNC_INTERVAL_SECONDS = float(os.environ.get("REPLICA_SYNC_INTERVAL_SECONDS", "2"))
+
+last_synced_at = None  # time.monotonic() of the last completed sync
+
+def _sqlite_path(db_url):
+    url = make_url(db_url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return os.path.abspath(url.database)
+
+def sqlite_replica_paths():
+    """Files of the SQLite replicas of a SQLite primary, in config order."""
+    primary = _sqlite_path(SQLALCHEMY_DATABASE_URL)
+    if primary is None:
+        return []
+    paths = []
+    for db_url in DATABASE_REPLICA_URLS + ASYNC_DATABASE_REPLICA_URLS:
+        path = _sqlite_path(db_url)
+        if path is not None and path != primary and path not in paths:
+            paths.append(path)
+    return paths
+
+def sync():
+    """Copy the primary into every SQLite replica; returns how many were synced."""
+    global last_synced_at
+    paths = sqlite_replica_paths()
+    if not paths:
+        return 0
+    started = time.monotonic()
+    source = sqlite3.connect(_sqlite_path(SQLALCHEMY_DATABASE_URL))
+    try:
+        for path in paths:
+            # Readers of the replica keep their snapshot until the copy commits
+            target = sqlite3.connect(path, timeout=30)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+    last_synced_at = started
+    return len(paths)
+
+def lag_seconds():
+    """Upper bound on how far the SQLite replicas are behind, or None."""
+    return time.monotonic() - last_synced_at if last_synced_at is not None else None
+
+async def run_periodically(interval=REPLICA_SYNC_INTERVAL_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(sync)
+        except Exception:
+            logger.exception("replica sync failed")
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    synced = sync()
+    print(f"synced {synced} replica(s) in {time.perf_counter() - started:.2f}s: {', '.join(sqlite_replica_paths())}")
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import re
+import threading
+from collections import defaultdict
+from urllib.parse import parse_qsl, urlencode
+
+import tokens
+from cache import TTLCache
+
+# Response cache for the read endpoints that clients poll. A GET to one of
+# CACHED_ROUTES is keyed by path, normalized query string and Authorization
+# header, so every user only ever sees their own cached responses. Cached
+# responses carry an ETag; a matching If-None-Match is answered with a 304
+# straight from the cache, without touching the database or serializing.
+#
+# Each entry records the version of the tags it depends on, and the crud write
+# paths bump those versions through invalidate(), which drops every dependent
+# entry at once. Changes that happen without a write are covered by TTL_HINTS
+# (the live index knows when the next gathering window opens or closes) and
+# otherwise bounded by RESPONSE_CACHE_TTL, which is why it is kept short; that
+# includes writes made by other worker processes.
+#
+# A cached response is only served while its bearer token is still known to
+# be valid (tokens.cached_claims), so an expired or revoked token goes
+# through to the route and gets its 401 there.
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "5"))  # 0 disables
+
+# Path pattern -> function giving the tags a response depends on
+CACHED_ROUTES = [
+    (re.compile(r"^/gatherings/(?:nearby|my-donations|search)?$"), lambda m: ("gatherings",)),
+    (re.compile(r"^/gatherings/suggestions$"), lambda m: ("gatherings", "suggestions")),
+    (re.compile(r"^/gatherings/(\d+)$"), lambda m: (f"gathering:{m[1]}", "users")),
+    (re.compile(r"^/claims/(?:my-claims|for-my-gatherings)$"), lambda m: ("claims", "users")),
+    (re.compile(r"^/users/(\d+)$"), lambda m: ("users",)),
+]
+
+# Tag -> function giving the seconds until responses with that tag go stale
+# without any write, or None if unknown
+TTL_HINTS = {}
+
+_SKIPPED_HEADERS = {b"content-length", b"date", b"etag", b"cache-control"}
+
+cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+_versions = defaultdict(int)
+_versions_lock = threading.Lock()
+
+def invalidate(*tags):
+    """Drop every cached response that depends on any of the tags."""
+    with _versions_lock:
+        for tag in tags:
+            _versions[tag] += 1
+
+def _current(tags):
+    return tuple(_versions[tag] for tag in tags)
+
+def _tags_for(path):
+    for pattern, tags in CACHED_ROUTES:
+        match = pattern.match(path)
+        if match:
+            return tags(match)
+    return None
+
+def _ttl_for(tags):
+    ttl = RESPONSE_CACHE_TTL
+    for tag in tags:
+        hint = TTL_HINTS.get(tag)
+        seconds = hint() if hint is not None else None
+        if seconds is not None:
+            ttl = min(ttl, seconds)
+    return ttl
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+def _token_valid(authorization):
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    return scheme.lower() == "bearer" and tokens.cached_claims(token) is not None
+
+def _etag_matches(if_none_match, etag):
+    if if_none_match is None:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(b",")]
+    return b"*" in candidates or etag in candidates or b"W/" + etag in candidates
+
+def stats():
+    return cache.stats()
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving CACHED_ROUTES from the response cache."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if RESPONSE_CACHE_TTL <= 0 or scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        tags = _tags_for(scope["path"])
+        if tags is None:
+            return await self.app(scope, receive, send)
+
+        query = urlencode(sorted(parse_qsl(scope["query_string"].decode(), keep_blank_values=True)))
+        authorization = _header(scope, b"authorization")
+        if authorization is not None and not _token_valid(authorization):
+            return await self.app(scope, receive, send)
+        key = (scope["path"], query, authorization)
+        if_none_match = _header(scope, b"if-none-match")
+
+        entry = cache.get(key)
+        if entry is not None and entry[0] == _current(tags):
+            _, etag, status, headers, body = entry
+            scope["response_cache"] = "hit"  # for metrics, as no route runs
+            if _etag_matches(if_none_match, etag):
+                return await self._send(send, 304, [(b"etag", etag)], b"")
+            return await self._send(send, status, headers + [(b"etag", etag)], body)
+
+        versions = _current(tags)  # taken before the handler reads anything
+        start, chunks = None, []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if message["status"] == 200 and content_type.startswith(b"application/json"):
+                    start = message
+                    return
+            elif start is not None:
+                chunks.append(message.get("body", b""))
+                if message.get("more_body"):
+                    return
+                body = b"".join(chunks)
+                etag = b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+                headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in _SKIPPED_HEADERS]
+                cache.set(key, (versions, etag, start["status"], headers, body), ttl=_ttl_for(tags))
+                if _etag_matches(if_none_match, etag):
+                    return await self._send(send, 304, [(b"etag", etag)], b"")
+                return await self._send(send, start["status"], headers + [(b"etag", etag)], body)
+            await send(message)
+
+        await self.app(scope, receive, capture)
+
+    @staticmethod
+    async def _send(send, status, headers, body):
+        headers = headers + [(b"cache-control", b"private, no-cache")]
+        if status != 304:
+            headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
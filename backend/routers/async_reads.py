@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import crud, crud_async, models, pagination, schemas, serialization, user_cache
+from database import get_async_db
+from routers.users import oauth2_scheme, decode_access_token, cache_current_user
+
+# Async versions of the high-traffic read endpoints, backed by the optional
+# AsyncSession stack. main.py mounts this router ahead of the sync routers when
+# ASYNC_DATABASE_URL is set, so these paths take precedence; everything else
+# keeps using the sync endpoints.
+
+router = APIRouter(responses={404: {"description": "Not found"}})
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    payload = decode_access_token(token)
+    cached_user = user_cache.get(payload["sub"])
+    if cached_user is not None:
+        return cached_user
+    user = await crud_async.get_user_by_email(db, email=payload["sub"])
+    return cache_current_user(user, payload)
+
+@router.get("/gatherings/", response_model=List[schemas.GatheringResponse], tags=["gatherings"])
+async def read_gatherings(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    format: str = "json",
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    if current_user.user_type != "recipient":
+        raise HTTPException(
+            status_code=403,
+            detail="Only recipients can view available gatherings"
+        )
+    pagination.check_list_params(sort, format)
+    after = pagination.decode_cursor(cursor, sort)
+    fast = serialization.FAST_SERIALIZATION
+    if format == "ndjson":
+        fetch = crud.get_available_gathering_rows if fast else crud.get_available_gatherings
+        return pagination.ndjson_response(
+            lambda db, after, limit: fetch(db, limit=limit, after=after, sort=sort),
+            schemas.GatheringResponse, db, sort=sort, after=after
+        )
+    fetch = crud_async.get_available_gathering_rows if fast else crud_async.get_available_gatherings
+    gatherings = await fetch(db, skip=skip, limit=limit + 1, after=after, sort=sort)
+    return serialization.respond(response, pagination.paginate(response, gatherings, limit, sort), fast)
+
+@router.get("/gatherings/nearby", response_model=List[schemas.NearbyGatheringResponse], tags=["gatherings"])
+async def read_nearby_gatherings(
+    response: Response,
+    latitude: float = Query(...),
+    longitude: float = Query(...),
+    max_distance: float = Query(10.0),  # Default 10 km
+    limit: Optional[int] = Query(None, ge=1),
+    after_distance: Optional[float] = Query(None),
+    after_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    if current_user.user_type != "recipient":
+        raise HTTPException(
+            status_code=403,
+            detail="Only recipients can view nearby gatherings"
+        )
+    if (after_distance is None) != (after_id is None):
+        raise HTTPException(
+            status_code=400,
+            detail="after_distance and after_id must be given together"
+        )
+    after = (after_distance, after_id) if after_id is not None else None
+    fast = serialization.FAST_SERIALIZATION
+    fetch = crud_async.get_nearby_gathering_rows if fast else crud_async.get_nearby_gatherings
+    gatherings = await fetch(
+        db,
+        latitude=latitude,
+        longitude=longitude,
+        max_distance_km=max_distance,
+        limit=limit,
+        after=after
+    )
+    return serialization.respond(response, gatherings, fast)
+
+@router.get("/users/{user_id:int}", response_model=schemas.UserResponse, tags=["users"])
+async def read_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud_async.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_user
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Response
 from sqlalchemy.orm import Session
-from typing import List
-import crud, models, schemas
+from typing import List, Optional
+import crud, models, pagination, schemas, serialization
 from database import get_db
 from routers.users import get_current_user
 
@@ -68,6 +68,10 @@ def update_claim_status(
 
 @router.get("/my-claims", response_model=List[schemas.ClaimDetail])
 def read_user_claims(
+    response: Response,
+    limit: int = Query(100, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,  # X-Next-Cursor of the previous page
+    format: str = "json",          # "json" or "ndjson" to stream everything
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -76,11 +80,24 @@ def read_user_claims(
             status_code=403, 
             detail="Only recipients can view their claims"
         )
-    claims = crud.get_user_claims(db, user_id=current_user.id)
-    return claims
+    pagination.check_list_params(format=format)
+    after = pagination.decode_cursor(cursor)
+    fast = serialization.FAST_SERIALIZATION
+    fetch = crud.get_user_claim_rows if fast else crud.get_user_claims
+    if format == "ndjson":
+        return pagination.ndjson_response(
+            lambda db, after, limit: fetch(db, user_id=current_user.id, limit=limit, after=after),
+            schemas.ClaimDetail, db, after=after
+        )
+    claims = fetch(db, user_id=current_user.id, limit=limit + 1, after=after)
+    return serialization.respond(response, pagination.paginate(response, claims, limit), fast)
 
 @router.get("/for-my-gatherings", response_model=List[schemas.ClaimDetail])
 def read_claims_for_user_gatherings(
+    response: Response,
+    limit: int = Query(100, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = "json",
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -90,10 +107,15 @@ def read_claims_for_user_gatherings(
             detail="Only donors can view claims for their gatherings"
         )
     
-    # Get all user's gatherings
-    gatherings = crud.get_user_gatherings(db, user_id=current_user.id)
-    gathering_ids = [g.id for g in gatherings]
-    
-    # Get all claims for these gatherings
-    claims = db.query(models.Claim).filter(models.Claim.gathering_id.in_(gathering_ids)).all()
-    return claims
\ No newline at end of file
+    pagination.check_list_params(format=format)
+    after = pagination.decode_cursor(cursor)
+    fast = serialization.FAST_SERIALIZATION
+    fetch = crud.get_claim_rows_for_donor if fast else crud.get_claims_for_donor
+    if format == "ndjson":
+        return pagination.ndjson_response(
+            lambda db, after, limit: fetch(db, donor_id=current_user.id, limit=limit, after=after),
+            schemas.ClaimDetail, db, after=after
+        )
+    # Get the claims for the user's gatherings
+    claims = fetch(db, donor_id=current_user.id, limit=limit + 1, after=after)
+    return serialization.respond(response, pagination.paginate(response, claims, limit), fast)
\ No newline at end of file
@@ -0,0 +1,94 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+import events, models
+from routers.users import get_current_user, decode_access_token
+
+router = APIRouter(
+    prefix="/feed",
+    tags=["feed"],
+    responses={404: {"description": "Not found"}},
+)
+
+KEEPALIVE_SECONDS = 15
+
+def _ws_message(event):
+    # event["data"] is already serialized JSON, so splice it in as-is
+    return f'{{"type": "{event["type"]}", "gathering": {event["data"]}}}'
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    latitude: float = Query(...),
+    longitude: float = Query(...),
+    radius_km: float = Query(10.0, gt=0),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Server-sent events for gatherings created, claimed, reopened or collected
+    within radius_km of the given point.
+    """
+    async def generate():
+        # Subscribed here rather than in the endpoint: a client that goes
+        # away before the first step never runs the generator, or its finally
+        subscription = events.broker.subscribe(latitude, longitude, radius_km)
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {event['data']}\n\n"
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+@router.websocket("/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    token: str,
+    latitude: float,
+    longitude: float,
+    radius_km: float = 10.0
+):
+    """
+    The same feed over a WebSocket. Browsers cannot set an Authorization
+    header on WebSockets, so the access token is passed as ?token=.
+    """
+    try:
+        decode_access_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if radius_km <= 0:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = events.broker.subscribe(latitude, longitude, radius_km)
+    # Watch for the client going away while waiting for events
+    receiver = asyncio.ensure_future(websocket.receive_text())
+    try:
+        while True:
+            getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await websocket.send_text(_ws_message(getter.result()))
+            else:
+                getter.cancel()
+            if receiver in done:
+                receiver.result()  # raises WebSocketDisconnect when closed
+                receiver = asyncio.ensure_future(websocket.receive_text())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        events.broker.unsubscribe(subscription)
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
-import crud, models, schemas
+import json
+import crud, matching, models, pagination, schemas, serialization
 from database import get_db
 from routers.users import get_current_user
 
@@ -24,10 +27,91 @@ def create_gathering(
         )
     return crud.create_gathering(db=db, gathering=gathering, user_id=current_user.id)
 
+BULK_MAX_ITEMS = 10000
+
+def _validate_bulk(body: bytes, content_type: str):
+    """
+    Parse a JSON array or NDJSON body and validate every item in one pass.
+    Returns the valid items as (index, GatheringCreate) and the rejected ones
+    as BulkGatheringResult errors.
+    """
+    if content_type.startswith(pagination.NDJSON_MEDIA_TYPE):
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as error:
+                items.append(error)
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BULK_MAX_ITEMS} gatherings per request"
+        )
+
+    valid, rejected = [], []
+    for index, item in enumerate(items):
+        if isinstance(item, ValueError):
+            rejected.append(schemas.BulkGatheringResult(index=index, error=f"invalid JSON: {item}"))
+            continue
+        try:
+            valid.append((index, schemas.GatheringCreate.parse_obj(item)))
+        except ValidationError as error:
+            message = "; ".join(
+                f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors()
+            )
+            rejected.append(schemas.BulkGatheringResult(index=index, error=message))
+    return valid, rejected
+
+@router.post("/bulk", response_model=schemas.BulkGatheringResponse)
+async def create_gatherings_bulk(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Create many gatherings at once from a JSON array, or from NDJSON with
+    Content-Type: application/x-ndjson. Valid items are inserted in one
+    transaction; invalid ones are reported per item and skipped.
+    """
+    if current_user.user_type != "donor":
+        raise HTTPException(
+            status_code=403, 
+            detail="Only donors can create gatherings"
+        )
+    body = await request.body()
+    valid, rejected = await run_in_threadpool(
+        _validate_bulk, body, request.headers.get("content-type", "")
+    )
+    ids = await run_in_threadpool(
+        crud.create_gatherings_bulk, db, [gathering for _, gathering in valid], current_user.id
+    )
+    created = [
+        schemas.BulkGatheringResult(index=index, id=gathering_id)
+        for (index, _), gathering_id in zip(valid, ids)
+    ]
+    return schemas.BulkGatheringResponse(
+        created=len(created),
+        failed=len(rejected),
+        results=sorted(created + rejected, key=lambda result: result.index)
+    )
+
 @router.get("/", response_model=List[schemas.GatheringResponse])
 def read_gatherings(
-    skip: int = 0, 
-    limit: int = 100, 
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,  # X-Next-Cursor of the previous page
+    sort: str = "id",              # "id" or "available_to"
+    format: str = "json",          # "json" or "ndjson" to stream everything
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -36,14 +120,27 @@ def read_gatherings(
             status_code=403, 
             detail="Only recipients can view available gatherings"
         )
-    gatherings = crud.get_available_gatherings(db, skip=skip, limit=limit)
-    return gatherings
+    pagination.check_list_params(sort, format)
+    after = pagination.decode_cursor(cursor, sort)
+    fast = serialization.FAST_SERIALIZATION
+    fetch = crud.get_available_gathering_rows if fast else crud.get_available_gatherings
+    if format == "ndjson":
+        return pagination.ndjson_response(
+            lambda db, after, limit: fetch(db, limit=limit, after=after, sort=sort),
+            schemas.GatheringResponse, db, sort=sort, after=after
+        )
+    gatherings = fetch(db, skip=skip, limit=limit + 1, after=after, sort=sort)
+    return serialization.respond(response, pagination.paginate(response, gatherings, limit, sort), fast)
 
-@router.get("/nearby", response_model=List[schemas.GatheringResponse])
+@router.get("/nearby", response_model=List[schemas.NearbyGatheringResponse])
 def read_nearby_gatherings(
+    response: Response,
     latitude: float = Query(...),
     longitude: float = Query(...),
     max_distance: float = Query(10.0),  # Default 10 km
+    limit: Optional[int] = Query(None, ge=1),
+    after_distance: Optional[float] = Query(None),  # Cursor: distance and id
+    after_id: Optional[int] = Query(None),          # of the previous page's last item
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -52,16 +149,79 @@ def read_nearby_gatherings(
             status_code=403, 
             detail="Only recipients can view nearby gatherings"
         )
-    gatherings = crud.get_nearby_gatherings(
+    if (after_distance is None) != (after_id is None):
+        raise HTTPException(
+            status_code=400,
+            detail="after_distance and after_id must be given together"
+        )
+    after = (after_distance, after_id) if after_id is not None else None
+    fast = serialization.FAST_SERIALIZATION
+    fetch = crud.get_nearby_gathering_rows if fast else crud.get_nearby_gatherings
+    gatherings = fetch(
         db, 
         latitude=latitude, 
         longitude=longitude, 
-        max_distance_km=max_distance
+        max_distance_km=max_distance,
+        limit=limit,
+        after=after
     )
-    return gatherings
+    return serialization.respond(response, gatherings, fast)
+
+@router.get("/search", response_model=List[schemas.SearchResultResponse])
+def search_gatherings(
+    q: str = Query(..., min_length=1),             # words that must all appear in food_details
+    latitude: Optional[float] = Query(None),
+    longitude: Optional[float] = Query(None),
+    max_distance: float = Query(10.0),
+    sort: str = Query("relevance"),                # "relevance" or "distance"
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    if current_user.user_type != "recipient":
+        raise HTTPException(
+            status_code=403, 
+            detail="Only recipients can search gatherings"
+        )
+    if (latitude is None) != (longitude is None):
+        raise HTTPException(
+            status_code=400,
+            detail="latitude and longitude must be given together"
+        )
+    if sort not in ("relevance", "distance") or (sort == "distance" and latitude is None):
+        raise HTTPException(
+            status_code=400,
+            detail='sort must be "relevance", or "distance" with a location'
+        )
+    return crud.search_gatherings(
+        db, q, latitude=latitude, longitude=longitude, max_distance_km=max_distance,
+        sort=sort, skip=skip, limit=limit
+    )
+
+@router.get("/suggestions", response_model=List[schemas.SuggestionResponse])
+def read_suggestions(
+    limit: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Gatherings suggested for the current recipient by the latest matching
+    run, best first.
+    """
+    if current_user.user_type != "recipient":
+        raise HTTPException(
+            status_code=403, 
+            detail="Only recipients can view suggestions"
+        )
+    return matching.suggestions_for(db, current_user.id, limit=limit)
 
 @router.get("/my-donations", response_model=List[schemas.GatheringResponse])
 def read_user_gatherings(
+    response: Response,
+    limit: int = Query(100, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = "json",
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -70,8 +230,17 @@ def read_user_gatherings(
             status_code=403, 
             detail="Only donors can view their donations"
         )
-    gatherings = crud.get_user_gatherings(db, user_id=current_user.id)
-    return gatherings
+    pagination.check_list_params(format=format)
+    after = pagination.decode_cursor(cursor)
+    fast = serialization.FAST_SERIALIZATION
+    fetch = crud.get_user_gathering_rows if fast else crud.get_user_gatherings
+    if format == "ndjson":
+        return pagination.ndjson_response(
+            lambda db, after, limit: fetch(db, user_id=current_user.id, limit=limit, after=after),
+            schemas.GatheringResponse, db, after=after
+        )
+    gatherings = fetch(db, user_id=current_user.id, limit=limit + 1, after=after)
+    return serialization.respond(response, pagination.paginate(response, gatherings, limit), fast)
 
 @router.get("/{gathering_id}", response_model=schemas.GatheringDetail)
 def read_gathering(
@@ -79,7 +248,7 @@ def read_gathering(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    gathering = crud.get_gathering(db, gathering_id=gathering_id)
+    gathering = crud.get_gathering_detail(db, gathering_id=gathering_id)
     if gathering is None:
         raise HTTPException(status_code=404, detail="Gathering not found")
     
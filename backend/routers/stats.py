@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List
+import models, schemas, stats
+from database import get_db
+from routers.users import get_current_user
+
+# Counters maintained by crud (see stats.py), so each of these reads a few
+# rows however long the history is
+router = APIRouter(
+    prefix="/stats",
+    tags=["stats"],
+)
+
+@router.get("/summary", response_model=schemas.StatsSummary)
+def read_summary(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return stats.summary(db)
+
+@router.get("/donors/me", response_model=schemas.DonorStats)
+def read_my_stats(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    if current_user.user_type != "donor":
+        raise HTTPException(
+            status_code=403,
+            detail="Only donors have donation stats"
+        )
+    return stats.for_donor(db, current_user.id)
+
+@router.get("/donors/top", response_model=List[schemas.DonorStats])
+def read_top_donors(
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return stats.top_donors(db, limit=limit)
+
+@router.get("/areas", response_model=List[schemas.AreaStats])
+def read_open_by_area(
+    precision: int = Query(stats.STATS_AREA_PRECISION, ge=1, le=7),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return stats.open_by_area(db, precision=precision)
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
-import crud, models, schemas
+import crud, metrics, models, schemas, tokens, user_cache
 from database import get_db
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 import jwt
+import time
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -18,36 +21,78 @@ router = APIRouter(
 SECRET_KEY = "your_secret_key"  # Change this in production!
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 14
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, token_type: str = "access"):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # jti identifies the token for revocation (see tokens.py)
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex, "type": token_type})
+    with metrics.JWT_SECONDS.time("encode"):
+        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def create_token_pair(email: str) -> dict:
+    return {
+        "access_token": create_access_token(
+            data={"sub": email}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        ),
+        "refresh_token": create_access_token(
+            data={"sub": email}, expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), token_type="refresh"
+        ),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+def decode_access_token(token: str, token_type: str = "access") -> dict:
+    # Access tokens seen before skip verification until they expire
+    if token_type == "access":
+        payload = tokens.cached_claims(token)
+        if payload is not None:
+            return payload
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with metrics.JWT_SECONDS.time("decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
     except jwt.PyJWTError:
         raise credentials_exception
-    user = crud.get_user_by_email(db, email=email)
+    # Tokens issued before refresh tokens existed have no type
+    if payload.get("type", "access") != token_type or tokens.is_revoked(payload):
+        raise credentials_exception
+    if token_type == "access":
+        tokens.remember(token, payload)
+    return payload
+
+def cache_current_user(user, payload: dict):
     if user is None:
         raise credentials_exception
-    return user
+    expires_in = payload["exp"] - time.time() if "exp" in payload else None
+    return user_cache.put(user, ttl=expires_in)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    payload = decode_access_token(token)
+
+    # Repeated requests within the token's lifetime skip the user lookup
+    cached_user = user_cache.get(payload["sub"])
+    if cached_user is not None:
+        return cached_user
+    # Off the event loop: a blocking lookup here can deadlock the loop on
+    # a connection pool that only threadpool teardown can refill
+    user = await run_in_threadpool(crud.get_user_by_email, db, email=payload["sub"])
+    return cache_current_user(user, payload)
 
 @router.post("/register", response_model=schemas.UserResponse)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
@@ -58,18 +103,41 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 @router.post("/token")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+    user = await crud.authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return create_token_pair(user.email)
+
+@router.post("/token/refresh")
+async def refresh_access_token(body: schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access and refresh token pair, without
+    the password check. The refresh token is single use: it is revoked here.
+    """
+    payload = decode_access_token(body.refresh_token, token_type="refresh")
+    # Revoked before anything else, in one step, so of concurrent refreshes
+    # with the same token only one gets a new pair
+    if not tokens.revoke(payload):
+        raise credentials_exception
+    if user_cache.get(payload["sub"]) is None:
+        user = await run_in_threadpool(crud.get_user_by_email, db, email=payload["sub"])
+        if user is None:
+            raise credentials_exception
+    return create_token_pair(payload["sub"])
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(body: Optional[schemas.RefreshTokenRequest] = Body(None), token: str = Depends(oauth2_scheme)):
+    """Revoke the current access token and, if given, the refresh token."""
+    tokens.revoke(decode_access_token(token))
+    if body is not None:
+        try:
+            tokens.revoke(decode_access_token(body.refresh_token, token_type="refresh"))
+        except HTTPException:
+            pass  # already expired or revoked
 
 @router.get("/me", response_model=schemas.UserResponse)
 async def read_users_me(current_user: models.User = Depends(get_current_user)):
@@ -25,6 +25,9 @@ class UserResponse(UserBase):
     class Config:
         orm_mode = True
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 # Gathering schemas
 class GatheringBase(BaseModel):
     food_details: str
@@ -44,6 +47,27 @@ class GatheringResponse(GatheringBase):
     class Config:
         orm_mode = True
 
+class NearbyGatheringResponse(GatheringResponse):
+    distance: float  # km from the query point
+
+class SuggestionResponse(GatheringResponse):
+    distance: float  # km from the recipient
+    score: float     # higher is better: nearer and closing sooner
+
+class SearchResultResponse(GatheringResponse):
+    score: float                      # text match, higher is better
+    distance: Optional[float] = None  # km from the query point, if given
+
+class BulkGatheringResult(BaseModel):
+    index: int                  # position in the submitted batch
+    id: Optional[int] = None    # set when the gathering was created
+    error: Optional[str] = None # set when the item was rejected
+
+class BulkGatheringResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkGatheringResult]
+
 class GatheringDetail(GatheringResponse):
     user: UserResponse
     
@@ -71,4 +95,25 @@ class ClaimDetail(ClaimResponse):
     recipient: UserResponse
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+# Stats schemas
+class DonationStats(BaseModel):
+    gatherings_posted: int
+    claims: int
+    claims_claimed: int                      # claims by current status
+    claims_collected: int
+    claims_cancelled: int
+    collection_rate: Optional[float] = None  # of all claims; None without claims
+    cancellation_rate: Optional[float] = None
+
+class StatsSummary(DonationStats):
+    open_gatherings: Optional[int] = None    # None while the live index is not loaded
+    reconciled_at: Optional[datetime] = None
+
+class DonorStats(DonationStats):
+    donor_id: int
+
+class AreaStats(BaseModel):
+    area: str                                # geohash cell
+    open_gatherings: int
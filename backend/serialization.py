@@ -0,0 +1,49 @@
+import os
+
+import orjson
+from fastapi.responses import Response
+
+import metrics, schemas
+
+# Fast serialization path for the list endpoints. Instead of loading ORM
+# objects and validating each one through the response model, the crud *_rows
+# functions select just the response columns and build plain dicts with the
+# schema's keys, which are encoded in one go with orjson. This skips
+# validation, so it is only used for rows read from our own tables, which
+# already satisfy the schemas. The output is the same JSON as the pydantic path.
+#
+# FAST_SERIALIZATION=0 switches the list endpoints back to the response model
+# path; benchmarks/serialization_bench.py compares the two.
+
+FAST_SERIALIZATION = os.environ.get("FAST_SERIALIZATION", "1") == "1"
+
+GATHERING_FIELDS = tuple(schemas.GatheringResponse.__fields__)
+USER_FIELDS = tuple(schemas.UserResponse.__fields__)
+CLAIM_FIELDS = tuple(schemas.ClaimResponse.__fields__)
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        with metrics.SERIALIZE_SECONDS.time("fast"):
+            return orjson.dumps(content)
+
+def gathering_dict(gathering, distance=False):
+    """Response dict for a gathering object (ORM row or live index snapshot)."""
+    row = {field: getattr(gathering, field) for field in GATHERING_FIELDS}
+    if distance:
+        row["distance"] = gathering.distance
+    return row
+
+def dumps(item):
+    return orjson.dumps(item)
+
+def respond(response, items, fast):
+    """
+    Return a page of list items: rows from the fast path go straight to
+    orjson, keeping any headers set on response (the next-page cursor);
+    ORM objects are returned for the route's response model to serialize.
+    """
+    if not fast:
+        return items
+    return FastJSONResponse(items, headers=dict(response.headers))
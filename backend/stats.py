@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+import geo, live_index, models
+from cache import TTLCache
+from database import engine, SessionLocal
+
+# Donation and claim statistics for the dashboards, without GROUP BYs over
+# the history on the request path.
+#
+# models.DonationStats keeps running counters per donor, plus one row for
+# all donors (ALL_DONORS). crud adds to them in the same transaction as the
+# write they count (gathering_posted, claim_created, claim_status_changed),
+# so the stats endpoints are primary key or index lookups.
+#
+# reconcile() recounts the counters from the gatherings and claims tables,
+# archive tables included, and corrects any drift. This covers rows written
+# outside crud, and history from before the counters existed. It works in
+# batches of STATS_RECONCILE_BATCH_SIZE donors, each one short transaction,
+# then checks the all-donors row against the sum of the donor rows.
+# It runs at startup and then every STATS_RECONCILE_INTERVAL_SECONDS (0
+# disables it). Run `python stats.py` to reconcile now.
+#
+# Open food per area comes from the live index: it is counted over the open
+# gatherings only, never the history, and cached for a few seconds.
+
+logger = logging.getLogger(__name__)
+
+STATS_RECONCILE_INTERVAL_SECONDS = float(os.environ.get("STATS_RECONCILE_INTERVAL_SECONDS", "3600"))
+STATS_RECONCILE_BATCH_SIZE = int(os.environ.get("STATS_RECONCILE_BATCH_SIZE", "200"))
+STATS_RECONCILE_PAUSE_SECONDS = float(os.environ.get("STATS_RECONCILE_PAUSE_SECONDS", "0.05"))
+STATS_AREA_PRECISION = 5  # geohash cells of ~4.9km x 4.9km
+STATS_AREA_CACHE_SECONDS = 10
+
+ALL_DONORS = 0
+COUNTERS = ("gatherings_posted", "claims", "claims_claimed", "claims_collected", "claims_cancelled")
+STATUS_COUNTERS = {"claimed": "claims_claimed", "collected": "claims_collected", "cancelled": "claims_cancelled"}
+
+def _insert(db, table):
+    """INSERT with on_conflict_do_update/nothing, for the session's database."""
+    dialect = {"sqlite": sqlite, "postgresql": postgresql}[db.get_bind().dialect.name]
+    return dialect.insert(table)
+
+def _add(db, donor_id, deltas):
+    """Add deltas to the donor's counters and to the all-donors row."""
+    table = models.DonationStats.__table__
+    statement = _insert(db, table).values([
+        {name: deltas.get(name, 0) for name in COUNTERS} | {"donor_id": row_id}
+        for row_id in {donor_id, ALL_DONORS}
+    ])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.donor_id],
+        set_={name: table.c[name] + statement.excluded[name] for name in deltas}
+    ))
+
+# Incremental updates, called by crud before it commits
+
+def gathering_posted(db, donor_id, count=1):
+    _add(db, donor_id, {"gatherings_posted": count})
+
+def claim_created(db, donor_id):
+    _add(db, donor_id, {"claims": 1, "claims_claimed": 1})
+
+def claim_status_changed(db, donor_id, old_status, new_status):
+    deltas = Counter()
+    if old_status in STATUS_COUNTERS:
+        deltas[STATUS_COUNTERS[old_status]] -= 1
+    if new_status in STATUS_COUNTERS:
+        deltas[STATUS_COUNTERS[new_status]] += 1
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        _add(db, donor_id, deltas)
+
+# Reads
+
+def _with_rates(row, **extra):
+    counts = {name: getattr(row, name, 0) if row is not None else 0 for name in COUNTERS}
+    claims = counts["claims"]
+    return {
+        **counts,
+        "collection_rate": counts["claims_collected"] / claims if claims else None,
+        "cancellation_rate": counts["claims_cancelled"] / claims if claims else None,
+        **extra,
+    }
+
+def summary(db):
+    totals = db.get(models.DonationStats, ALL_DONORS)
+    return _with_rates(
+        totals,
+        open_gatherings=live_index.index.open_count() if live_index.index.loaded else None,
+        reconciled_at=last_report.finished_at if last_report else None,
+    )
+
+def for_donor(db, donor_id):
+    return _with_rates(db.get(models.DonationStats, donor_id), donor_id=donor_id)
+
+def top_donors(db, limit=10):
+    rows = db.query(models.DonationStats).filter(
+        models.DonationStats.donor_id != ALL_DONORS
+    ).order_by(models.DonationStats.gatherings_posted.desc()).limit(limit).all()
+    return [_with_rates(row, donor_id=row.donor_id) for row in rows]
+
+_areas = TTLCache(maxsize=16, ttl=STATS_AREA_CACHE_SECONDS)
+
+def open_by_area(db, precision=STATS_AREA_PRECISION):
+    """[{area: geohash cell, open_gatherings: n}], busiest first."""
+    areas = _areas.get(precision)
+    if areas is not None:
+        return areas
+    if live_index.index.loaded:
+        points = [(g.latitude, g.longitude) for g in live_index.index.open_gatherings()]
+    else:
+        now = datetime.now()
+        points = db.query(models.Gathering.latitude, models.Gathering.longitude).filter(models.is_available(now)).all()
+    counts = Counter(geo.encode(latitude, longitude, precision) for latitude, longitude in points)
+    areas = [{"area": area, "open_gatherings": n} for area, n in counts.most_common()]
+    _areas.set(precision, areas)
+    return areas
+
+# Reconciliation
+
+@dataclass
+class ReconcileReport:
+    started_at: datetime
+    finished_at: datetime = None
+    donors: int = 0
+    corrected: int = 0  # donors whose counters had drifted
+    batches: int = 0
+    totals_corrected: bool = False
+    seconds: float = 0.0
+
+totals = {"corrected": 0}
+last_report = None
+_run_lock = threading.Lock()
+
+def _recount(db, donor_ids):
+    """Counters of the given donors, counted from the base and archive tables."""
+    counts = {donor_id: dict.fromkeys(COUNTERS, 0) for donor_id in donor_ids}
+    for gathering in (models.Gathering, models.ArchivedGathering):
+        rows = db.execute(
+            select(gathering.user_id, func.count())
+            .where(gathering.user_id.in_(donor_ids))
+            .group_by(gathering.user_id)
+        )
+        for donor_id, n in rows:
+            counts[donor_id]["gatherings_posted"] += n
+    for gathering, claim in ((models.Gathering, models.Claim), (models.ArchivedGathering, models.ArchivedClaim)):
+        rows = db.execute(
+            select(gathering.user_id, claim.status, func.count())
+            .join(gathering, gathering.id == claim.gathering_id)
+            .where(gathering.user_id.in_(donor_ids))
+            .group_by(gathering.user_id, claim.status)
+        )
+        for donor_id, status, n in rows:
+            counts[donor_id]["claims"] += n
+            if status in STATUS_COUNTERS:
+                counts[donor_id][STATUS_COUNTERS[status]] += n
+    return counts
+
+def reconcile_batch(db, donor_ids):
+    """Correct the counters of the given donors; returns how many had drifted."""
+    table = models.DonationStats.__table__
+    try:
+        # A write first, so the transaction holds the write lock: no claim
+        # can commit between the recount and the correction
+        db.execute(_insert(db, table).values([
+            dict.fromkeys(COUNTERS, 0) | {"donor_id": donor_id} for donor_id in donor_ids
+        ]).on_conflict_do_nothing())
+        stored = {row.donor_id: row for row in db.execute(select(table).where(table.c.donor_id.in_(donor_ids)))}
+        corrected = 0
+        for donor_id, counts in _recount(db, donor_ids).items():
+            drift = {name: counts[name] - getattr(stored[donor_id], name) for name in COUNTERS}
+            drift = {name: delta for name, delta in drift.items() if delta}
+            if drift:
+                corrected += 1
+                logger.info("stats drift for donor %d: %s", donor_id, drift)
+                db.execute(update(table).where(table.c.donor_id == donor_id).values(**counts))
+                # The all-donors row moves by the same amounts, until
+                # reconcile_totals checks it at the end of the run
+                _add(db, ALL_DONORS, drift)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return corrected
+
+def reconcile_totals(db):
+    """Make the all-donors row the sum of the donor rows; True if it had drifted."""
+    table = models.DonationStats.__table__
+    try:
+        # Write lock first, as in reconcile_batch
+        db.execute(_insert(db, table).values(
+            dict.fromkeys(COUNTERS, 0) | {"donor_id": ALL_DONORS}
+        ).on_conflict_do_nothing())
+        sums = db.execute(
+            select(*[func.coalesce(func.sum(table.c[name]), 0) for name in COUNTERS])
+            .where(table.c.donor_id != ALL_DONORS)
+        ).one()
+        counts = dict(zip(COUNTERS, sums))
+        stored = db.execute(select(table).where(table.c.donor_id == ALL_DONORS)).one()
+        drifted = any(getattr(stored, name) != counts[name] for name in COUNTERS)
+        if drifted:
+            logger.info("stats drift for all donors: %s", counts)
+            db.execute(update(table).where(table.c.donor_id == ALL_DONORS).values(**counts))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return drifted
+
+def reconcile(db, batch_size=None, pause=None):
+    global last_report
+    batch_size = batch_size or STATS_RECONCILE_BATCH_SIZE
+    pause = STATS_RECONCILE_PAUSE_SECONDS if pause is None else pause
+    with _run_lock:
+        report = ReconcileReport(started_at=datetime.now())
+        started = time.perf_counter()
+        last_id = 0
+        while True:
+            donor_ids = db.scalars(
+                select(models.User.id)
+                .where(models.User.user_type == "donor", models.User.id > last_id)
+                .order_by(models.User.id).limit(batch_size)
+            ).all()
+            if not donor_ids:
+                break
+            corrected = reconcile_batch(db, donor_ids)
+            report.batches += 1
+            report.donors += len(donor_ids)
+            report.corrected += corrected
+            totals["corrected"] += corrected
+            last_id = donor_ids[-1]
+            if len(donor_ids) < batch_size:
+                break
+            time.sleep(pause)
+        report.totals_corrected = reconcile_totals(db)
+        report.seconds = time.perf_counter() - started
+        report.finished_at = datetime.now()
+        last_report = report
+        return report
+
+def run_with_session(**options):
+    db = SessionLocal()
+    try:
+        return reconcile(db, **options)
+    finally:
+        db.close()
+
+async def run_periodically(interval=STATS_RECONCILE_INTERVAL_SECONDS):
+    while True:
+        try:
+            report = await asyncio.to_thread(run_with_session)
+            if report.corrected or report.totals_corrected:
+                logger.warning("stats reconciliation corrected %d of %d donors%s", report.corrected, report.donors,
+                               " and the totals" if report.totals_corrected else "")
+        except Exception:
+            logger.exception("stats reconciliation failed")
+        await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+    models.Base.metadata.create_all(bind=engine)
+    report = run_with_session()
+    print(f"reconciled {report.donors} donors in {report.batches} batches, {report.seconds:.2f}s: "
+          f"{report.corrected} corrected")
@@ -0,0 +1,127 @@
+import asyncio
+import contextlib
+import itertools
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+# The backend reads its configuration at import, so the environment is set
+# before any of it is imported: a throwaway database, no background jobs, and
+# no response cache or rate limits unless a test turns them on.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+for name in ("MATCH_INTERVAL_SECONDS", "ARCHIVE_INTERVAL_SECONDS", "STATS_RECONCILE_INTERVAL_SECONDS",
+             "RESPONSE_CACHE_TTL", "RATE_LIMIT", "WARMUP"):
+    os.environ[name] = "0"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main, models  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+from passwords import hash_password  # noqa: E402
+from routers.users import create_access_token  # noqa: E402
+
+PASSWORD = "test-password"
+_ids = itertools.count()
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture(scope="session")
+def password_hash():
+    return hash_password(PASSWORD)
+
+@pytest.fixture
+def make_user(client, password_hash):
+    """make_user(user_type) -> (user id, Authorization headers), a new user each call."""
+    def make(user_type="recipient", latitude=12.97, longitude=77.59):
+        email = f"{user_type}{next(_ids)}@example.com"
+        db = SessionLocal()
+        try:
+            user = models.User(name=email, email=email, password=password_hash, user_type=user_type,
+                               latitude=latitude, longitude=longitude)
+            db.add(user)
+            db.commit()
+            token = create_access_token({"sub": email}, timedelta(hours=1))
+            return user.id, {"Authorization": f"Bearer {token}"}
+        finally:
+            db.close()
+    return make
+
+@pytest.fixture
+def make_gathering(client):
+    """make_gathering(donor_id, **columns) -> gathering id, open for the next hours by default."""
+    def make(donor_id, **columns):
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            gathering = models.Gathering(**{
+                "user_id": donor_id, "food_details": "rice and dal", "is_taken": False,
+                "available_from": now - timedelta(hours=1), "available_to": now + timedelta(hours=6),
+                "latitude": 12.97, "longitude": 77.59, **columns,
+            })
+            db.add(gathering)
+            db.commit()
+            return gathering.id
+        finally:
+            db.close()
+    return make
+
+@contextlib.contextmanager
+def count_queries():
+    """Collects the SQL statements executed inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+async def open_stream(path, headers, disconnected):
+    """Start a GET of a streaming path on the app; returns once its response has started."""
+    started = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200
+            started.set()
+        await asyncio.sleep(0)  # a network write, which lets other tasks run
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "headers": [(b"host", b"test"), *[
+            (name.lower().encode(), value.encode()) for name, value in headers.items()
+        ]], "client": ("127.0.0.1", 1234), "server": ("test", 80),
+    }
+    task = asyncio.create_task(main.app(scope, receive, send))
+    await asyncio.wait_for(started.wait(), 5)
+    return task
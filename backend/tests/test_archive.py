@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+import archive, models
+
+def test_finished_gatherings_move_to_the_archive_with_their_claims(db, make_user, make_gathering):
+    donor_id, _ = make_user("donor")
+    recipient_id, _ = make_user("recipient")
+    now = datetime.now()
+    closed = now - timedelta(days=archive.ARCHIVE_AFTER_DAYS + 1)
+    window = {"available_from": closed - timedelta(hours=6), "available_to": closed}
+    collected = make_gathering(donor_id, is_taken=True, **window)
+    uncollected = make_gathering(donor_id, is_taken=True, **window)  # claimed, never collected
+    unclaimed = make_gathering(donor_id, **window)
+    recent = make_gathering(donor_id, is_taken=True, available_from=now - timedelta(days=2),
+                            available_to=now - timedelta(days=1))
+    for gathering_id, status in ((collected, "collected"), (uncollected, "claimed"), (recent, "claimed")):
+        db.add(models.Claim(gathering_id=gathering_id, recipient_id=recipient_id,
+                            claim_time=closed - timedelta(hours=1), status=status))
+    db.commit()
+
+    report = archive.run(db, now=now, batch_size=2, pause=0)
+    assert report.finished
+    assert report.gatherings >= 3 and report.claims >= 2
+
+    ids = [collected, uncollected, unclaimed, recent]
+    assert [i for i, in db.query(models.Gathering.id).filter(models.Gathering.id.in_(ids))] == [recent]
+    assert sorted(i for i, in db.query(models.ArchivedGathering.id).filter(
+        models.ArchivedGathering.id.in_(ids))) == sorted([collected, uncollected, unclaimed])
+    assert sorted(db.query(models.ArchivedClaim.status).filter(
+        models.ArchivedClaim.gathering_id.in_(ids)).all()) == [("claimed",), ("collected",)]
+    assert db.query(models.Claim).filter(models.Claim.gathering_id.in_(ids)).count() == 1
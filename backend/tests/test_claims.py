@@ -0,0 +1,32 @@
+import asyncio
+
+import httpx
+
+import main, models
+
+async def claim_all(headers_list, gathering_id):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+        responses = await asyncio.gather(*[
+            client.post("/claims/", headers=headers, json={"gathering_id": gathering_id})
+            for headers in headers_list
+        ])
+    return [response.status_code for response in responses]
+
+def test_concurrent_claims_have_one_winner(db, make_user, make_gathering):
+    donor_id, _ = make_user("donor")
+    recipients = [make_user("recipient")[1] for _ in range(30)]
+    for _ in range(3):
+        gathering_id = make_gathering(donor_id)
+        statuses = asyncio.run(claim_all(recipients, gathering_id))
+        assert sorted(statuses) == [200] + [400] * (len(recipients) - 1)
+        assert db.query(models.Claim).filter(models.Claim.gathering_id == gathering_id).count() == 1
+        assert db.get(models.Gathering, gathering_id).is_taken
+
+def test_claiming_a_taken_gathering_fails(client, make_user, make_gathering):
+    donor_id, _ = make_user("donor")
+    _, first = make_user("recipient")
+    _, second = make_user("recipient")
+    gathering_id = make_gathering(donor_id)
+    assert client.post("/claims/", headers=first, json={"gathering_id": gathering_id}).status_code == 200
+    assert client.post("/claims/", headers=second, json={"gathering_id": gathering_id}).status_code == 400
@@ -0,0 +1,17 @@
+import asyncio
+
+import events
+from tests.conftest import open_stream
+
+def test_streams_closed_before_they_start_do_not_leak_subscriptions(make_user):
+    _, headers = make_user("recipient")
+
+    async def run():
+        disconnected = asyncio.Event()
+        disconnected.set()  # the client is gone by the time the stream starts
+        for _ in range(5):
+            await (await open_stream("/feed/events?latitude=12.97&longitude=77.59", headers, disconnected))
+
+    subscribers = events.broker.subscriber_count
+    asyncio.run(run())
+    assert events.broker.subscriber_count == subscribers
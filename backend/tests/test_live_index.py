@@ -0,0 +1,67 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import live_index, models
+
+@pytest.fixture
+def index(db, monkeypatch):
+    """The app's live index, freshly loaded, with only crud keeping it current."""
+    monkeypatch.setattr(live_index.index, "max_age", None)
+    monkeypatch.setattr(live_index.index, "sync_interval", None)
+    live_index.index.load(db)
+    return live_index.index
+
+def gathering_json(hours=6, **fields):
+    now = datetime.now()
+    return {
+        "food_details": "bread", "latitude": 12.97, "longitude": 77.59,
+        "available_from": (now - timedelta(hours=1)).isoformat(),
+        "available_to": (now + timedelta(hours=hours)).isoformat(), **fields,
+    }
+
+def test_index_agrees_with_sql_after_each_write(client, db, index, make_user):
+    _, donor = make_user("donor")
+    _, recipient = make_user("recipient")
+
+    created = client.post("/gatherings/", headers=donor, json=gathering_json()).json()
+    index.verify(db)
+    assert created["id"] in index.open_ids()
+
+    bulk = client.post("/gatherings/bulk", headers=donor, json=[gathering_json(), gathering_json()]).json()
+    assert bulk["created"] == 2
+    index.verify(db)
+
+    claim = client.post("/claims/", headers=recipient, json={"gathering_id": created["id"]}).json()
+    index.verify(db)
+    assert created["id"] not in index.open_ids()
+
+    response = client.put(f"/claims/{claim['id']}/status", headers=recipient, params={"status": "cancelled"})
+    assert response.status_code == 200
+    index.verify(db)
+    assert created["id"] in index.open_ids()
+
+    closing = client.post("/gatherings/", headers=donor, json=gathering_json(hours=1 / 3600)).json()
+    assert closing["id"] in index.get_open([closing["id"]])
+    time.sleep(1.1)
+    index.verify(db)
+    assert closing["id"] not in index.open_ids()
+
+def test_sync_picks_up_writes_of_other_processes(client, db, index, make_user, make_gathering):
+    donor_id, _ = make_user("donor")
+    recipient_id, recipient = make_user("recipient")
+    claimed = make_gathering(donor_id)
+    index.sync(db)
+
+    # Written straight to the database, as another worker would
+    added = make_gathering(donor_id)
+    db.get(models.Gathering, claimed).is_taken = True
+    db.add(models.Claim(gathering_id=claimed, recipient_id=recipient_id, claim_time=datetime.now(), status="claimed"))
+    db.commit()
+    assert set(index.get_open([added, claimed])) == {claimed}
+
+    index.sync_interval = 0  # the next read syncs
+    ids = {g["id"] for g in client.get("/gatherings/", headers=recipient, params={"limit": 1000}).json()}
+    assert added in ids and claimed not in ids
+    index.verify(db)
@@ -0,0 +1,36 @@
+import pytest
+
+import pagination
+
+@pytest.mark.parametrize("path, role", [
+    ("/gatherings/", "recipient"),
+    ("/gatherings/my-donations", "donor"),
+    ("/claims/my-claims", "recipient"),
+    ("/claims/for-my-gatherings", "donor"),
+])
+@pytest.mark.parametrize("limit", [0, -2, pagination.MAX_PAGE_SIZE + 1])
+def test_out_of_range_limits_are_rejected(client, make_user, path, role, limit):
+    _, headers = make_user(role)
+    assert client.get(path, headers=headers, params={"limit": limit}).status_code == 422
+
+def test_cursor_pages_through_everything(client, make_user, make_gathering):
+    donor_id, donor = make_user("donor")
+    created = [make_gathering(donor_id) for _ in range(5)]
+    seen, params = [], {"limit": 2}
+    while True:
+        response = client.get("/gatherings/my-donations", headers=donor, params=params)
+        seen += [gathering["id"] for gathering in response.json()]
+        cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+        params["cursor"] = cursor
+    assert seen == created
+
+def test_cursor_header_is_exposed_to_browsers(client, make_user, make_gathering):
+    donor_id, donor = make_user("donor")
+    make_gathering(donor_id)
+    make_gathering(donor_id)
+    response = client.get("/gatherings/my-donations", params={"limit": 1},
+                          headers={**donor, "Origin": "http://localhost:5173"})
+    exposed = response.headers["access-control-expose-headers"].lower().split(", ")
+    assert pagination.NEXT_CURSOR_HEADER.lower() in exposed
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+
+import models, serialization
+from tests.conftest import count_queries
+
+@pytest.fixture
+def claimed(db, make_user, make_gathering):
+    """claimed(n) -> (donor headers, recipient headers, a gathering id) with n claimed gatherings."""
+    def make(count):
+        donor_id, donor = make_user("donor")
+        recipient_id, recipient = make_user("recipient")
+        for _ in range(count):
+            gathering_id = make_gathering(donor_id, is_taken=True)
+            db.add(models.Claim(gathering_id=gathering_id, recipient_id=recipient_id,
+                                claim_time=datetime.now(), status="claimed"))
+        db.commit()
+        return donor, recipient, gathering_id
+    return make
+
+def statement_count(client, path, headers):
+    client.get(path, headers=headers).raise_for_status()  # caches the user
+    with count_queries() as statements:
+        client.get(path, headers=headers).raise_for_status()
+    return len(statements)
+
+# Both serialization paths: rows for the fast one, eager-loaded objects for
+# the response models
+@pytest.mark.parametrize("fast", [True, False], ids=["fast", "orm"])
+@pytest.mark.parametrize("path, role", [
+    ("/claims/my-claims", "recipient"),
+    ("/claims/for-my-gatherings", "donor"),
+    ("/gatherings/{id}", "donor"),
+])
+def test_statement_count_does_not_grow_with_rows(client, claimed, monkeypatch, path, role, fast):
+    monkeypatch.setattr(serialization, "FAST_SERIALIZATION", fast)
+    counts = []
+    for size in (2, 40):
+        donor, recipient, gathering_id = claimed(size)
+        headers = donor if role == "donor" else recipient
+        counts.append(statement_count(client, path.format(id=gathering_id), headers))
+    assert counts[0] == counts[1]
+    assert counts[0] > 0  # measured, not served from a cache
@@ -0,0 +1,67 @@
+import asyncio
+import re
+
+import httpx
+import pytest
+
+import main, rate_limit
+from tests.conftest import open_stream
+
+@pytest.fixture
+def limits(monkeypatch):
+    """limits(concurrent, queued) turns rate limiting on with fresh buckets and slots."""
+    def configure(concurrent=64, queued=0):
+        monkeypatch.setattr(rate_limit, "RATE_LIMIT", True)
+        monkeypatch.setattr(rate_limit, "backend", rate_limit.InMemoryBuckets())
+        monkeypatch.setattr(rate_limit, "limiter", rate_limit.ConcurrencyLimiter(concurrent, queued, 0.1))
+    return configure
+
+def app_client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+def test_requests_over_the_budget_get_429(client, limits, monkeypatch):
+    limits()
+    monkeypatch.setattr(rate_limit, "RATE_LIMITS", [("default", None, re.compile(r""), 1 / 60, 3, False)])
+    statuses = [client.get("/").status_code for _ in range(5)]
+    assert statuses == [200, 200, 200, 429, 429]
+    response = client.get("/")
+    assert int(response.headers["retry-after"]) >= 1
+    assert client.get("/metrics").status_code == 200  # exempt
+
+def test_requests_without_a_free_slot_get_503(limits):
+    limits(concurrent=1)
+
+    async def run():
+        async with app_client() as client:
+            assert await rate_limit.limiter.acquire()  # the only slot, held elsewhere
+            busy = await client.get("/")
+            rate_limit.limiter.release()
+            return busy, await client.get("/")
+
+    busy, free = asyncio.run(run())
+    assert busy.status_code == 503
+    assert busy.headers["retry-after"] == "1"
+    assert free.status_code == 200
+
+def test_feed_streams_do_not_hold_admission_slots(limits, make_user):
+    limits(concurrent=3)
+    _, headers = make_user("recipient")
+
+    async def run():
+        disconnected = asyncio.Event()
+        streams = [
+            await open_stream("/feed/events?latitude=12.97&longitude=77.59", headers, disconnected)
+            for _ in range(3)
+        ]
+        try:
+            async with app_client() as client:
+                return rate_limit.limiter.active, [
+                    (await client.get(path, headers=headers)).status_code for path in ("/", "/users/me")
+                ]
+        finally:
+            disconnected.set()
+            await asyncio.gather(*streams)
+
+    active, statuses = asyncio.run(run())
+    assert active == 0
+    assert statuses == [200, 200]
@@ -0,0 +1,38 @@
+import json
+import sqlite3
+
+from fastapi.testclient import TestClient
+from sqlalchemy.engine import make_url
+
+import database, main
+
+def test_a_client_reads_its_own_writes_until_the_replica_catches_up(tmp_path, monkeypatch, make_user):
+    donor_id, headers = make_user("donor")
+    # A replica copied before the write, as if it lagged the primary
+    replica_path = tmp_path / "replica.db"
+    with sqlite3.connect(make_url(database.SQLALCHEMY_DATABASE_URL).database) as primary, \
+            sqlite3.connect(replica_path) as replica:
+        primary.backup(replica)
+    replica_engine, _ = database.get_engine_and_session(f"sqlite:///{replica_path}", read_only=True)
+    monkeypatch.setattr(database, "replica_engines", [replica_engine])
+
+    client = TestClient(main.app)  # its own cookie jar
+    created = client.post("/gatherings/", headers=headers, json={
+        "food_details": "idli", "available_from": "2030-01-01T08:00:00", "available_to": "2030-01-01T20:00:00",
+        "latitude": 12.97, "longitude": 77.59,
+    })
+    assert database.REPLICA_STICKY_COOKIE in created.cookies
+
+    def donation_ids(format):
+        response = client.get(f"/gatherings/my-donations?format={format}", headers=headers)
+        if format == "ndjson":
+            return [json.loads(line)["id"] for line in response.text.splitlines()]
+        return [gathering["id"] for gathering in response.json()]
+
+    gathering_id = created.json()["id"]
+    for format in ("json", "ndjson"):
+        assert gathering_id in donation_ids(format)  # from the primary
+    client.cookies.clear()
+    for format in ("json", "ndjson"):
+        assert gathering_id not in donation_ids(format)  # from the replica
+    replica_engine.dispose()
@@ -0,0 +1,27 @@
+import response_cache
+from cache import TTLCache
+from tests.conftest import count_queries
+
+def test_polls_get_304_without_touching_the_database(client, monkeypatch, make_user, make_gathering):
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_TTL", 60)
+    monkeypatch.setattr(response_cache, "cache", TTLCache(maxsize=100, ttl=60))
+    donor_id, donor = make_user("donor")
+    _, recipient = make_user("recipient")
+    gathering_id = make_gathering(donor_id)
+    path = f"/gatherings/{gathering_id}"
+
+    client.get(path, headers=donor)  # validates the token, which is then cached
+    first = client.get(path, headers=donor)
+    etag = first.headers["etag"]
+    poll = {**donor, "If-None-Match": etag}
+    with count_queries() as statements:
+        unchanged = client.get(path, headers=poll)
+    assert unchanged.status_code == 304
+    assert statements == []
+
+    # A claim is a write to the gathering, so the next poll gets the new body
+    assert client.post("/claims/", json={"gathering_id": gathering_id}, headers=recipient).status_code == 200
+    changed = client.get(path, headers=poll)
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["is_taken"] is True
@@ -0,0 +1,38 @@
+import asyncio
+
+import httpx
+
+import main, user_cache
+from tests.conftest import PASSWORD
+
+def login(client, email, password=PASSWORD):
+    return client.post("/users/token", data={"username": email, "password": password})
+
+def test_login(client, make_user):
+    user_id, headers = make_user("donor")
+    email = client.get("/users/me", headers=headers).json()["email"]
+    response = login(client, email)
+    assert response.status_code == 200
+    me = client.get("/users/me", headers={"Authorization": f"Bearer {response.json()['access_token']}"})
+    assert me.json()["id"] == user_id
+    assert login(client, email, "wrong").status_code == 401
+    assert login(client, "nobody@example.com").status_code == 401
+
+def test_refresh_tokens_are_single_use(client, make_user):
+    _, headers = make_user("donor")
+    email = client.get("/users/me", headers=headers).json()["email"]
+    refresh_token = login(client, email).json()["refresh_token"]
+    user_cache.invalidate(email)  # so both requests wait on the user lookup
+
+    async def refresh_twice():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as app_client:
+            return await asyncio.gather(*[
+                app_client.post("/users/token/refresh", json={"refresh_token": refresh_token})
+                for _ in range(2)
+            ])
+
+    responses = asyncio.run(refresh_twice())
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 401]
+    assert client.post("/users/token/refresh", json={"refresh_token": refresh_token}).status_code == 401
@@ -0,0 +1,87 @@
+import importlib
+import os
+import threading
+import time
+
+from cache import TTLCache
+
+# Verified access tokens and revoked token ids, for get_current_user.
+#
+# A token that has passed signature and claims verification is remembered,
+# with its claims, until it expires, so repeated requests with the same
+# bearer token skip the HMAC check and the claims parsing. Every token carries
+# a unique id (its "jti" claim). Revoking a token adds that id to the
+# revocation list until the token would have expired anyway. The list is
+# checked on every request, cached or not, with one set lookup.
+#
+# Revocations are kept in this process by default. To share them between
+# workers, set TOKEN_REVOCATION_BACKEND to "module:Class". The class needs
+# `jti in backend` and add(jti, expires_at), which returns whether the jti
+# was new; it must be atomic (e.g. Redis SET NX with an expiry at
+# expires_at), as it is what makes refresh tokens single use.
+
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.environ.get("TOKEN_CACHE_TTL", "3600"))
+
+class InMemoryRevocations:
+    """Revoked token ids of this process, each kept until its token expires."""
+
+    def __init__(self):
+        self._expires = {}  # jti -> expires_at (unix time)
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def add(self, jti, expires_at):
+        """Revoke jti; False if it already was."""
+        now = time.time()
+        with self._lock:
+            if now >= self._next_purge:
+                self._expires = {j: e for j, e in self._expires.items() if e > now}
+                self._next_purge = now + 60
+            if jti in self._expires:
+                return False
+            self._expires[jti] = expires_at
+            return True
+
+    def __contains__(self, jti):
+        return jti in self._expires
+
+    def __len__(self):
+        return len(self._expires)
+
+def _load_backend():
+    spec = os.environ.get("TOKEN_REVOCATION_BACKEND")
+    if not spec:
+        return InMemoryRevocations()
+    module_name, class_name = spec.split(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+verified = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+revocations = _load_backend()
+
+def is_revoked(claims):
+    jti = claims.get("jti")
+    return jti is not None and jti in revocations
+
+def cached_claims(token):
+    """Claims of a token verified earlier, or None if unknown, expired or revoked."""
+    claims = verified.get(token)
+    if claims is None:
+        return None
+    if is_revoked(claims):
+        verified.pop(token)
+        return None
+    return claims
+
+def remember(token, claims):
+    if "exp" in claims:
+        verified.set(token, claims, ttl=claims["exp"] - time.time())
+
+def revoke(claims):
+    """Revoke a token; True only for the call that revoked it."""
+    if "jti" not in claims:
+        return False
+    return revocations.add(claims["jti"], claims.get("exp", time.time() + TOKEN_CACHE_TTL))
+
+def stats():
+    return verified.stats()
@@ -0,0 +1,49 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from cache import TTLCache
+
+# Cache of authenticated users keyed by the token subject (email), so
+# get_current_user does not look the user up on every request. Entries live at
+# most as long as the token that produced them and are dropped whenever the
+# user row changes (see the mapper events in models.py).
+
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "300"))
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    id: int
+    name: str
+    email: str
+    user_type: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+    @classmethod
+    def from_model(cls, user):
+        return cls(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            user_type=user.user_type,
+            latitude=user.latitude,
+            longitude=user.longitude,
+        )
+
+cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def get(email):
+    return cache.get(email)
+
+def put(user, ttl=None):
+    snapshot = UserSnapshot.from_model(user)
+    cache.set(snapshot.email, snapshot, ttl=ttl)
+    return snapshot
+
+def invalidate(email):
+    cache.pop(email)
+
+def stats():
+    return cache.stats()
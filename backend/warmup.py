@@ -0,0 +1,76 @@
+import logging
+import os
+import time
+
+import crud, database, live_index, pagination, passwords, stats
+
+# Work a worker does before it reports ready, so its first requests do not
+# pay for it. main.py runs it at the end of the lifespan startup, and uvicorn
+# and gunicorn only accept connections once that is done.
+#
+#   connections  open WARMUP_CONNECTIONS pooled connections to the primary
+#                and to each replica (SQLite sets its pragmas per connection)
+#   live_index   build the live index's point arrays and sort orders,
+#                which it otherwise builds on the first nearby and list reads
+#   passwords    build the bcrypt context and load its backend
+#   queries      run the hot read queries once, so their SQL is compiled and
+#                cached by SQLAlchemy and prepared by the database
+#
+# Each step is timed into report. WARMUP=0 skips them all. Add a step by
+# appending (name, function) to STEPS.
+
+logger = logging.getLogger(__name__)
+
+WARMUP = os.environ.get("WARMUP", "1") == "1"
+WARMUP_CONNECTIONS = int(os.environ.get("WARMUP_CONNECTIONS", "2"))
+
+def _open_connections():
+    for engine in [database.engine, *database.replica_engines]:
+        connections = [engine.connect() for _ in range(WARMUP_CONNECTIONS)]
+        for connection in connections:
+            connection.close()  # back to the pool, still open
+
+def _prime_live_index():
+    db = database.SessionLocal()
+    try:
+        live_index.index.nearby(db, 0.0, 0.0, 0.001, limit=1)
+        for sort in pagination.SORT_KEYS:
+            live_index.index.available(db, limit=1, sort=sort)
+    finally:
+        db.close()
+
+def _run_queries():
+    # Lookups of ids and emails that do not exist: the statements are the
+    # ones requests run, without loading anything
+    db = database.read_session()
+    try:
+        crud.get_user(db, 0)
+        crud.get_user_by_email(db, "")
+        crud.get_gathering_detail(db, 0)
+        crud.get_user_gathering_rows(db, 0, limit=1)
+        crud.get_user_claim_rows(db, 0, limit=1)
+        crud.get_claim_rows_for_donor(db, 0, limit=1)
+        crud.search_gatherings(db, "warmup", limit=1)
+        stats.for_donor(db, 0)
+    finally:
+        db.close()
+
+STEPS = [
+    ("connections", _open_connections),
+    ("live_index", _prime_live_index),
+    ("passwords", passwords.warm_up),
+    ("queries", _run_queries),
+]
+
+report = {}  # step -> seconds
+
+def run():
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            # A cold first request is better than a worker that never starts
+            logger.exception("warm-up step %s failed", name)
+        report[name] = time.perf_counter() - started
+    return report